@@ -12,6 +12,11 @@ class AutosaveCommand(Command, metaclass=abc.ABCMeta):
         super().__init__(app, app_args, cmd_name)
         self.log = logging.getLogger(__name__)
 
+    def sheet_changed(self, sheet: PuzzleSheet, sheet_id: str):
+        """Called after a command changed a sheet."""
+        self.app.puzzle_sheet_repository.sheet_changed(sheet_id)
+        self.autosave_sheet(sheet, sheet_id)
+
     def autosave_sheet(self, sheet: PuzzleSheet, sheet_id: str):
         if self.app.config.get(AppConfig.AUTOSAVE_PUZZLE_SHEETS_KEY):
             self.app.save_file_service.save_sheet(sheet, sheet_id, self.app.config)
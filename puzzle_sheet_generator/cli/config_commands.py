@@ -25,8 +25,11 @@ class ChangeConfig(Command):
         self.log.debug(f'Running {self.cmd_name} with arguments {parsed_args}')
         if parsed_args.config_key == AppConfig.LICHESS_PUZZLE_DB_KEY \
                 and self.app.config.set(parsed_args.config_key, parsed_args.value):
-            lichess_puzzle_db = self.app.load_lichess_puzzle_db()
-            self.app.puzzle_store_repository.reset_main_store(lichess_puzzle_db)
+            self.app.start_loading_lichess_puzzle_db()
+
+        if parsed_args.config_key == AppConfig.LICHESS_PUZZLE_DB_SCHEMA_KEY \
+                and self.app.config.set(parsed_args.config_key, parsed_args.value):
+            self.app.start_loading_lichess_puzzle_db()
 
         if parsed_args.config_key == AppConfig.DIAGRAM_BOARD_COLORS_PATH_KEY:
             self.app.config.set_diagram_board_colors_from_file(parsed_args.value)
@@ -35,8 +38,23 @@ class ChangeConfig(Command):
             bool_value = self._parse_bool_value(parsed_args.value)
             if bool_value is None:
                 self.log.warning(f'The given value {parsed_args.value} could not be parsed as boolean.')
-            else:
-                self.app.config.set(parsed_args.config_key, bool_value)
+            elif self.app.config.set(parsed_args.config_key, bool_value):
+                if parsed_args.config_key == AppConfig.FILTER_RESULT_DISK_CACHE_KEY:
+                    self.app.filter_result_cache = self.app.create_filter_result_cache()
+                if parsed_args.config_key == AppConfig.DIAGRAM_DISK_CACHE_KEY:
+                    self.app.diagram_cache.set_cache_dir(self.app.get_diagram_cache_dir())
+
+        if parsed_args.config_key in (AppConfig.DIAGRAM_RENDERER_KEY, AppConfig.RENDER_POOL_KEY) \
+                and self.app.config.set(parsed_args.config_key, parsed_args.value):
+            self.app.reset_board_renderer()
+
+        if parsed_args.config_key in AppConfig.INTEGER_CONFIGS:
+            int_value = self._parse_int_value(parsed_args.value)
+            if int_value is None:
+                self.log.warning(f'The given value {parsed_args.value} could not be parsed as non-negative integer.')
+            elif self.app.config.set(parsed_args.config_key, int_value) \
+                    and parsed_args.config_key == AppConfig.RENDER_WORKERS_KEY:
+                self.app.reset_board_renderer()
 
     true_values = ('true', 't', 'yes', 'y', 'wahr', 'w', 'ja', 'j')
     false_values = ('false', 'f', 'no', 'n', 'falsch', 'nein')
@@ -47,6 +65,14 @@ class ChangeConfig(Command):
             return False
         return None
 
+    @staticmethod
+    def _parse_int_value(value: str) -> int | None:
+        try:
+            int_value = int(value)
+        except ValueError:
+            return None
+        return int_value if int_value >= 0 else None
+
 class RestoreDefaultConfig(Command):
     """Restore the default configuration values"""
     def __init__(self, app, app_args):
@@ -56,3 +82,5 @@ class RestoreDefaultConfig(Command):
     def take_action(self, parsed_args: Namespace) -> None:
         self.log.debug(f'Running {self.cmd_name}')
         self.app.config.set_default_configuration()
+        self.app.diagram_cache.set_cache_dir(self.app.get_diagram_cache_dir())
+        self.app.reset_board_renderer()
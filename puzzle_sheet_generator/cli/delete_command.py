@@ -21,5 +21,13 @@ class Delete(Command):
 
     def take_action(self, parsed_args: Namespace) -> None:
         self.log.debug(f'Running {self.cmd_name} with arguments {parsed_args}')
-        self.app.puzzle_store_repository.delete_by_id(parsed_args.id)
-        self.app.puzzle_sheet_repository.delete_by_id(parsed_args.id)
+        store_id = self.app.puzzle_store_repository.get_id_for_name(parsed_args.name)
+        sheet_id = self.app.puzzle_sheet_repository.get_id_for_name(parsed_args.name)
+        if store_id is not None:
+            self.app.puzzle_store_repository.delete_by_id(store_id)
+            self.log.info(f'Deleted the store with id "{store_id}".')
+        elif sheet_id is not None:
+            self.app.puzzle_sheet_repository.delete_by_id(sheet_id)
+            self.log.info(f'Deleted the sheet with id "{sheet_id}".')
+        else:
+            self.log.error('The given name is unknown.')
@@ -0,0 +1,172 @@
+import logging
+import time
+from argparse import ArgumentParser, Namespace
+from pathlib import Path
+
+import numpy
+
+from puzzle_sheet_generator.cli.autosave_command import AutosaveCommand
+from puzzle_sheet_generator.model.puzzle_sampler import PuzzleSampler
+from puzzle_sheet_generator.model.puzzle_sheet import PuzzleSheet
+from puzzle_sheet_generator.model.puzzle_store import PuzzleStore
+from puzzle_sheet_generator.pdf_generation import generate_pdf
+from puzzle_sheet_generator.pdf_generation.PuzzleLayout import HeaderFooterText, PuzzleLayout
+from puzzle_sheet_generator.psg_cliff import PSGApp
+
+
+class Generate(AutosaveCommand):
+    """Generate a workbook of puzzle sheets sampled from a store and print it to PDF"""
+
+    def __init__(self, app: PSGApp, app_args):
+        super().__init__(app, app_args, 'generate')
+        self.app = app
+        self.log = logging.getLogger(__name__)
+
+    def get_parser(self, prog_name: str) -> ArgumentParser:
+        parser = super().get_parser(prog_name)
+        parser.add_argument('store', help='Name of the puzzle store to sample from')
+        parser.add_argument('sheet', help='Name of the new puzzle sheets, they are numbered starting with 1')
+        parser.add_argument('count', type=int, help='Number of puzzle sheets to generate')
+        parser.add_argument('out_file', help='Filepath to where the generated PDF is saved.')
+        parser.add_argument(
+            '-l', '--layout',
+            choices=('6', '12'),
+            default='12',
+            help='The layout of the generated PDF. Either "6" or "12" for layouts with the respective number of '
+                 'puzzles on one page. Every sheet is filled with puzzles for one page.'
+        )
+        parser.add_argument(
+            '--separate',
+            action='store_true',
+            help='Print every sheet to its own PDF file, numbered like the sheets, instead of one PDF with a page '
+                 'per sheet'
+        )
+        parser.add_argument(
+            '-w', '--weight',
+            choices=tuple(PuzzleSampler.WEIGHT_COLUMNS),
+            help='Prefer popular or often played puzzles, proportional to their popularity or number of plays'
+        )
+        parser.add_argument('-s', '--seed', type=int, help='Seed for drawing the same puzzles again')
+        parser.add_argument(
+            '-u', '--unused',
+            action='store_true',
+            help='Only sample puzzles, that are not on any sheet of this session or any saved sheet'
+        )
+        parser.add_argument('--left-header', default='', help='Text in the top left header, the sheet name if empty')
+        parser.add_argument('--right-header', default='', help='Text in the top right header')
+        parser.add_argument('--footer', default='', help='Text in the footer')
+        return parser
+
+    def take_action(self, parsed_args: Namespace) -> None:
+        self.log.debug(f'Running {self.cmd_name} with arguments {parsed_args}')
+        store = self.app.puzzle_store_repository.get(parsed_args.store)
+        layout = generate_pdf.create_layout(parsed_args.layout)
+        out_path = Path(parsed_args.out_file)
+        excluded_rows = self.app.puzzle_sheet_repository.used_puzzles.get_bitmap(store) \
+            if parsed_args.unused and store is not None \
+            else None
+        if self._validate_args(parsed_args, store, layout, out_path, excluded_rows):
+            start_time = time.perf_counter()
+            sheets = self.generate_sheets(store, layout.MAXIMUM_PUZZLES_IN_LAYOUT, excluded_rows, parsed_args)
+            if not sheets:
+                self.log.error(f'The selected puzzle store {store.get_name()} contains no puzzles'
+                               f'{", that are not on any sheet" if excluded_rows is not None else ""}.')
+                return
+            sampled_time = time.perf_counter()
+            self.print_sheets(sheets, layout, out_path, parsed_args.separate)
+            end_time = time.perf_counter()
+            self.log.info(f'Generated {len(sheets)} sheets "{parsed_args.sheet}-1" to '
+                          f'"{parsed_args.sheet}-{len(sheets)}" from store {store.get_name()} at path {out_path}.')
+            self.log.info(f'{len(sheets) / (end_time - start_time):.2f} sheets per second '
+                          f'(sampling {sampled_time - start_time:.3f}s, printing {end_time - sampled_time:.3f}s).')
+
+    def _validate_args(
+            self,
+            parsed_args: Namespace,
+            store: PuzzleStore | None,
+            layout: PuzzleLayout,
+            out_path: Path,
+            excluded_rows: numpy.ndarray | None
+    ) -> bool:
+        if store is None:
+            self.log.error(f'There is no store with name "{parsed_args.store}".')
+            return False
+        if parsed_args.count <= 0:
+            self.log.error('The number of sheets has to be positive.')
+            return False
+        amount = parsed_args.count * layout.MAXIMUM_PUZZLES_IN_LAYOUT
+        # views are only checked for their size, puzzles that are on sheets are reported after sampling
+        number_of_excluded_rows = self.app.puzzle_sheet_repository.used_puzzles.count_used_rows() \
+            if excluded_rows is not None \
+            else 0
+        available = PuzzleSampler.max_available(store, number_of_excluded_rows)
+        if amount > available:
+            self.log.error(f'{parsed_args.count} sheets need {amount} puzzles, '
+                           f'but the selected puzzle store {store.get_name()} contains only {available} puzzles'
+                           f'{", that are not on any sheet" if excluded_rows is not None else ""}.')
+            return False
+        existing_names = {sheet.get_name() for sheet in self.app.puzzle_sheet_repository.items.values()}
+        for name in self.sheet_names(parsed_args.sheet, parsed_args.count):
+            if name in existing_names:
+                self.log.error(f'There is already a sheet with name "{name}".')
+                return False
+        out_paths = self.out_paths(out_path, parsed_args.count) if parsed_args.separate else [out_path]
+        for path in out_paths:
+            if path.exists() and path.is_file() and path.suffix.casefold() != '.pdf'.casefold():
+                self.log.error(f'The path "{path}" is not a PDF file and would be overwritten. Generate aborted.')
+                return False
+        return True
+
+    def generate_sheets(
+            self,
+            store: PuzzleStore,
+            amount_per_sheet: int,
+            excluded_rows: numpy.ndarray | None,
+            parsed_args: Namespace
+    ) -> list[PuzzleSheet]:
+        """
+        Sample the puzzles of all sheets in one draw, so no puzzle is on two of the sheets,
+        and add the sheets to the repository.
+        """
+        sampler = PuzzleSampler(store, parsed_args.weight, parsed_args.seed, excluded_rows)
+        puzzles = sampler.sample(parsed_args.count * amount_per_sheet)
+        if len(puzzles) < parsed_args.count * amount_per_sheet:
+            self.log.warning(f'Only {len(puzzles)} puzzles could be sampled'
+                             f'{", that are not on any sheet" if excluded_rows is not None else ""}.')
+        sheets = []
+        for index, name in enumerate(self.sheet_names(parsed_args.sheet, parsed_args.count)):
+            sheet_puzzles = puzzles[index * amount_per_sheet:(index + 1) * amount_per_sheet]
+            if not sheet_puzzles:
+                break
+            sheet = PuzzleSheet(
+                name,
+                sheet_puzzles,
+                parsed_args.left_header if parsed_args.left_header.strip() else name,
+                parsed_args.right_header,
+                parsed_args.footer
+            )
+            sheet_id = self.app.puzzle_sheet_repository.add(sheet)
+            self.autosave_sheet(sheet, sheet_id)
+            sheets.append(sheet)
+        return sheets
+
+    def print_sheets(self, sheets: list[PuzzleSheet], layout: PuzzleLayout, out_path: Path, separate: bool) -> None:
+        if separate:
+            drawings = self.app.board_renderer.render_sheets(sheets, self.app.config.diagram_board_colors)
+            out_paths = self.out_paths(out_path, len(sheets))
+            for sheet, sheet_drawings, path in zip(sheets, drawings, out_paths, strict=True):
+                with generate_pdf.PuzzleSheetDocument(path, layout) as document:
+                    header_footer_text = HeaderFooterText(sheet.left_header, sheet.right_header, sheet.footer)
+                    document.add_page(sheet_drawings, header_footer_text)
+        else:
+            with generate_pdf.PuzzleSheetDocument(out_path, layout, self.app.config, self.app.board_renderer) \
+                    as document:
+                document.add_sheets(sheets)
+
+    @staticmethod
+    def sheet_names(name: str, count: int) -> list[str]:
+        return [f'{name}-{number}' for number in range(1, count + 1)]
+
+    @staticmethod
+    def out_paths(out_path: Path, count: int) -> list[Path]:
+        return [out_path.with_name(f'{out_path.stem}-{number}{out_path.suffix}') for number in range(1, count + 1)]
@@ -3,12 +3,11 @@ from argparse import ArgumentParser, Namespace
 from pathlib import Path
 
 from cliff.command import Command
+from cliff.lister import Lister
 
 from puzzle_sheet_generator.model.puzzle_sheet import PuzzleSheet
 from puzzle_sheet_generator.pdf_generation import generate_pdf
-from puzzle_sheet_generator.pdf_generation.Layout6Puzzles import Layout6Puzzles
-from puzzle_sheet_generator.pdf_generation.Layout12Puzzles import Layout12Puzzles
-from puzzle_sheet_generator.pdf_generation.PuzzleLayout import HeaderFooterText, PageSettings, PuzzleLayout
+from puzzle_sheet_generator.pdf_generation.PuzzleLayout import PuzzleLayout
 from puzzle_sheet_generator.psg_cliff import PSGApp
 
 
@@ -47,10 +46,10 @@ class Print(Command):
                 sheet.right_header = parsed_args.right_header
             if parsed_args.footer  != '' and not parsed_args.footer.isspace():
                 sheet.footer = parsed_args.footer
-            svgs = sheet.get_svgs(self.app.config)
             layout = self.get_layout(parsed_args)
-            header_footer_text = HeaderFooterText(sheet.left_header, sheet.right_header, sheet.footer)
-            generate_pdf.make_pdf_puzzle_page(out_path, svgs, header_footer_text, layout)
+            with generate_pdf.PuzzleSheetDocument(out_path, layout, self.app.config, self.app.board_renderer) \
+                    as document:
+                document.add_sheet(sheet)
             self.log.info(f'Generated puzzle sheet "{sheet.get_name()}" at path {out_path}.')
 
     def _validate_args(self, parsed_args: Namespace, sheet: PuzzleSheet | None, out_path: Path) -> bool:
@@ -61,14 +60,36 @@ class Print(Command):
             return False
         return True
 
-    def get_layout(self, parsed_args: Namespace) -> PuzzleLayout | None:
-        if parsed_args.layout is None:
-            return None
-        page_settings = PageSettings()
-        match parsed_args.layout:
-            case '6':
-                return Layout6Puzzles(page_settings)
-            case '12':
-                return Layout12Puzzles(page_settings)
-            case _:
-                raise Exception(f'Unknown page layout {parsed_args.layout} in {self.cmd_name} command.')
+    @staticmethod
+    def get_layout(parsed_args: Namespace) -> PuzzleLayout | None:
+        return generate_pdf.create_layout(parsed_args.layout) if parsed_args.layout is not None else None
+
+class DiagramCache(Lister):
+    """Show the hit and miss counters of the cache of rendered diagrams or clear it"""
+    def __init__(self, app: PSGApp, app_args):
+        super().__init__(app, app_args, 'diagram-cache')
+        self.app = app
+        self.log = logging.getLogger(__name__)
+
+    def get_parser(self, prog_name: str) -> ArgumentParser:
+        parser = super().get_parser(prog_name)
+        parser.add_argument('--clear', action='store_true', help='Remove all cached diagrams')
+        return parser
+
+    def take_action(self, parsed_args: Namespace) -> tuple[tuple, tuple]:
+        self.log.debug(f'Running {self.cmd_name} with arguments {parsed_args}')
+        diagram_cache = self.app.diagram_cache
+        if parsed_args.clear:
+            diagram_cache.clear()
+            self.log.info('Cleared the diagram cache.')
+        hit_rate = diagram_cache.get_hit_rate()
+        columns = ('cached diagrams', 'hits', 'disk hits', 'misses', 'hit rate', 'on disk')
+        data = (
+            len(diagram_cache),
+            diagram_cache.hits,
+            diagram_cache.disk_hits,
+            diagram_cache.misses,
+            f'{hit_rate:.1%}' if hit_rate is not None else '',
+            diagram_cache.cache_dir is not None
+        )
+        return columns, (data,)
@@ -48,7 +48,7 @@ class AddTo(AutosaveCommand):
                 sheet.add([PositionByFEN(board)])
             self.log.info(f'The element was added to sheet "{sheet.get_name()}".')
             sheet_id = self.app.puzzle_sheet_repository.get_id_for_name(parsed_args.sheet)
-            self.autosave_sheet(sheet, sheet_id)
+            self.sheet_changed(sheet, sheet_id)
 
     def _validate_args(
             self,
@@ -126,7 +126,7 @@ class Remove(AutosaveCommand):
                 sheet.remove_by_index(index)
                 self.log.info(f'The element at index {index} was removed from sheet "{sheet.get_name()}".')
                 sheet_id = self.app.puzzle_sheet_repository.get_id_for_name(parsed_args.sheet)
-                self.autosave_sheet(sheet, sheet_id)
+                self.sheet_changed(sheet, sheet_id)
 
     def _validate_args(self, parsed_args: Namespace, sheet: PuzzleSheet | None) -> bool:
         if sheet is None:
@@ -158,7 +158,7 @@ class Reorder(AutosaveCommand):
             self.log.info(f'The elements at the indices {index_1} and {index_2} '
                           f'in sheet "{sheet.get_name()}" have been swapped.')
             sheet_id = self.app.puzzle_sheet_repository.get_id_for_name(parsed_args.sheet)
-            self.autosave_sheet(sheet, sheet_id)
+            self.sheet_changed(sheet, sheet_id)
 
     def _validate_args(self, parsed_args: Namespace, sheet: PuzzleSheet | None) -> bool:
         if sheet is None:
@@ -229,7 +229,7 @@ class Header(AutosaveCommand):
                 sheet.footer = parsed_args.footer
             self.log.info(f'The header of sheet "{sheet.get_name()}" has been set.')
             sheet_id = self.app.puzzle_sheet_repository.get_id_for_name(parsed_args.sheet)
-            self.autosave_sheet(sheet, sheet_id)
+            self.sheet_changed(sheet, sheet_id)
 
     def _validate_args(self, parsed_args: Namespace, sheet: PuzzleSheet | None) -> bool:
         if sheet is None:
@@ -6,15 +6,30 @@ from cliff.lister import Lister
 from puzzle_sheet_generator.model.puzzle_sheet import PuzzleSheet
 from puzzle_sheet_generator.model.puzzle_store import PuzzleStore
 from puzzle_sheet_generator.model.sheet_element import LichessPuzzle, PositionByFEN, SheetElement
+from puzzle_sheet_generator.model.store_statistics import StoreStatistics
 from puzzle_sheet_generator.psg_cliff import PSGApp
-
-puzzle_store_columns = ('StoreId', 'Name', 'nb puzzles', 'Themes', 'Openings', 'min_rating', 'max_rating')
+from puzzle_sheet_generator.puzzle_database.lichess_puzzle_db import LichessPuzzleDB
+
+puzzle_store_columns = (
+    'StoreId',
+    'Name',
+    'nb puzzles',
+    'Themes',
+    'Openings',
+    'min_rating',
+    'max_rating',
+    'median_rating',
+    'rating_quantiles',
+    'top_themes',
+    'moves'
+)
 puzzle_sheet_columns = ('SheetId', 'Name', 'nb puzzles')
 
 class List(Lister):
     """List all available stores or sheets"""
     sheets_type_args = ('sh', 'sheet', 'sheets')
     store_type_args = ('st', 'store', 'stores')
+    top_themes_to_list = 3
 
     def __init__(self, app: PSGApp, app_args):
         super().__init__(app, app_args, 'list')
@@ -50,23 +65,48 @@ class List(Lister):
         return puzzle_sheet_columns, tuple(data)
 
     def show_stores(self) -> tuple[tuple, tuple]:
+        puzzle_store_repository = self.app.puzzle_store_repository
         data = (
-            (
-                store_id,
-                store.get_name(),
-                len(store),
-                store.get_filtered_themes(),
-                store.get_openings(),
-                store.get_min_rating(),
-                store.get_max_rating()
-            )
-            for store_id, store in self.app.puzzle_store_repository.items.items()
+            self.loading_store_data(store_id)
+            if store_id == puzzle_store_repository.lichess_db_key and not puzzle_store_repository.is_main_store_loaded()
+            else self.store_data(store_id, puzzle_store_repository.get_by_id(store_id))
+            for store_id in puzzle_store_repository.items
+        )
+        return puzzle_store_columns, tuple(store for store in data if store is not None)
+
+    @staticmethod
+    def store_data(
+            store_id: str,
+            store: PuzzleStore | None,
+            quantiles: tuple[float, ...] = (0.25, 0.75),
+            top_themes: int = top_themes_to_list
+    ) -> tuple | None:
+        """Row of the store table, read from the statistics of the store."""
+        if store is None:
+            return None
+        statistics = store.get_statistics()
+        return (
+            store_id,
+            store.get_name(),
+            statistics.count,
+            store.get_filtered_themes(),
+            store.get_openings(),
+            statistics.min_rating,
+            statistics.max_rating,
+            statistics.median_rating,
+            ' '.join(f'p{quantile * 100:.0f}:{statistics.rating_quantiles[quantile]}' for quantile in quantiles),
+            ' '.join(f'{theme}:{count}' for theme, count in statistics.get_top_themes(top_themes).items()),
+            ' '.join(f'{moves}:{count}' for moves, count in statistics.moves_histogram.items())
         )
-        return puzzle_store_columns, tuple(data)
+
+    @staticmethod
+    def loading_store_data(store_id: str) -> tuple:
+        return store_id, LichessPuzzleDB.NAME, 'loading', *([''] * (len(puzzle_store_columns) - 3))
 
 
 class Show(Lister):
     """Show details about a store or sheet"""
+    top_themes_to_show = 10
 
     def __init__(self, app: PSGApp, app_args):
         super().__init__(app, app_args, 'show')
@@ -101,14 +141,7 @@ class Show(Lister):
         return (), ()
 
     def show_store(self, store: PuzzleStore, store_id: str) -> tuple[tuple, tuple]:
-        store_data = (
-            store_id,
-            store.__len__(),
-            store.get_filtered_themes(),
-            store.get_openings(),
-            store.get_min_rating(),
-            store.get_max_rating()
-        )
+        store_data = List.store_data(store_id, store, StoreStatistics.QUANTILES, self.top_themes_to_show)
         return puzzle_store_columns, (store_data,)
 
     def show_sheet(self, sheet: PuzzleSheet, sheet_id: str) -> tuple[tuple, tuple]:
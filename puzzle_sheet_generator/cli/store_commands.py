@@ -1,13 +1,27 @@
+import abc
+import difflib
 import logging
 from argparse import ArgumentParser, Namespace
 
+import numpy
 from cliff.command import Command
-from pandas import DataFrame
+from cliff.lister import Lister
 
 from puzzle_sheet_generator.cli.autosave_command import AutosaveCommand
+from puzzle_sheet_generator.model.filter_plan import (
+    ExcludedThemesPredicate,
+    FilterPlan,
+    MovesPredicate,
+    OpeningTagsPredicate,
+    Predicate,
+    RatingPredicate,
+    ThemesPredicate,
+)
+from puzzle_sheet_generator.model.puzzle_sampler import PuzzleSampler
 from puzzle_sheet_generator.model.puzzle_sheet import PuzzleSheet
 from puzzle_sheet_generator.model.puzzle_store import PuzzleStore
 from puzzle_sheet_generator.model.repository import PuzzleStoreRepository
+from puzzle_sheet_generator.model.sheet_element import LichessPuzzle
 from puzzle_sheet_generator.psg_cliff import PSGApp
 from puzzle_sheet_generator.puzzle_database import lichess_puzzle_themes
 
@@ -45,7 +59,17 @@ class FilterArgs:
             else set()
 
         self.filter_by_opening_tags = parsed_args.openings is not None
-        self.opening_tags = parsed_args.openings
+        self.opening_tags_from_user = parsed_args.openings
+        # the tags are checked against the index of the filtered store, stores without an index scan their tags
+        self.opening_tag_index = self.store.opening_tag_index \
+            if self.filter_by_opening_tags and self.store is not None \
+            else None
+        if self.opening_tag_index is not None:
+            self.opening_tags = {
+                self.opening_tag_index.to_canonical_form(opening_tag) for opening_tag in parsed_args.openings
+            } - {None}
+        else:
+            self.opening_tags = set(parsed_args.openings) if self.filter_by_opening_tags else set()
 
         self.min_moves = 1
         self.max_moves = 1
@@ -127,8 +151,21 @@ class FilterArgs:
         return valid
 
     def _validate_opening_tags(self) -> bool:
-        # todo: check opening tags
-        return True
+        if self.filter_by_opening_tags is False:
+            return True
+        if self.opening_tag_index is None:
+            self.log.warning(f'The store {self.store_name} has no opening tag index, the opening tags are not checked '
+                             f'and have to be spelled exactly as in the lichess puzzle database.')
+            return True
+        valid = True
+        for opening_tag in self.opening_tags_from_user:
+            if self.opening_tag_index.to_canonical_form(opening_tag) is None:
+                self.log.error(f'The opening tag "{opening_tag}" is not a lichess puzzle database opening tag.')
+                suggestions = difflib.get_close_matches(opening_tag, self.opening_tag_index.tags)
+                if suggestions:
+                    self.log.info(f'Similar opening tags are: {", ".join(suggestions)}')
+                valid = False
+        return valid
 
     def _validate_move_args(self) -> bool:
         if self.filter_by_moves is False:
@@ -148,6 +185,16 @@ class FilterArgs:
     def are_valid(self):
         return self._valid
 
+    def cache_key(self) -> tuple:
+        """Normalized filter criteria, filters that select the same puzzles from a store have the same key."""
+        return (
+            (self.min_rating, self.max_rating) if self.filter_by_rating else None,
+            sorted(self.themes) if self.filter_by_themes else None,
+            sorted(self.excluded_themes) if self.filter_excluded_themes else None,
+            sorted(self.opening_tags) if self.filter_by_opening_tags else None,
+            (self.min_moves, self.max_moves) if self.filter_by_moves else None,
+        )
+
 
 class Filter(Command):
     """Create a store of puzzles by filtering from the db or an existing store"""
@@ -173,6 +220,11 @@ class Filter(Command):
             type=int,
             help='Shorthand for setting "min-rating" to "rating - 100" and "max-rating" to "rating + 100"'
         )
+        parser.add_argument(
+            '--explain',
+            action='store_true',
+            help='Print the order the filters are evaluated in, with the rows scanned and the time per filter'
+        )
         return parser
 
     def take_action(self, parsed_args: Namespace) -> None:
@@ -180,55 +232,57 @@ class Filter(Command):
         filter_args = FilterArgs(parsed_args, self.app.puzzle_store_repository)
         if filter_args.are_valid():
             store = filter_args.store
-            puzzle_dataframe = store.puzzle_df
-            filtered_dataframe = self.filter_dataframe(puzzle_dataframe, filter_args)
-            if filtered_dataframe.empty:
+            filtered_store = self.filter_store(store, filter_args, parsed_args.explain)
+            if len(filtered_store) == 0:
                 self.log.error(f'The store "{store.name}" with id "{filter_args.store_id}" '
                               f'contains no puzzles that conform to the given filtering criteria.')
             else:
-                filtered_themes = self.calc_filtered_themes(filter_args)
-                filtered_opening_tags = {'mixed'}
-                filtered_store = PuzzleStore(
-                    filtered_dataframe,
-                    filter_args.filtered_store_name,
-                    filtered_themes,
-                    filtered_opening_tags
-                )
                 filtered_store_id = self.app.puzzle_store_repository.add(filtered_store)
                 self.log.info(f'Created new store "{parsed_args.name}" with id "{filtered_store_id}" '
-                              f'that contains {len(filtered_dataframe.index)} puzzles.')
+                              f'that contains {len(filtered_store)} puzzles.')
+
+    def filter_store(self, store: PuzzleStore, filter_args: FilterArgs, explain: bool = False) -> PuzzleStore:
+        """
+        Evaluate all filters in one filter plan and create a view of the matching puzzles.
+        The result is reused, when the same filters were already applied to the same puzzles.
+        """
+        filter_result_cache = self.app.filter_result_cache
+        row_ids = filter_result_cache.get(store, filter_args.cache_key())
+        if row_ids is not None:
+            if explain:
+                self.log.info(f'Reused the cached result of the filters for store "{store.name}".')
+        else:
+            plan = FilterPlan(store, self.build_predicates(filter_args))
+            row_ids = plan.execute()
+            filter_result_cache.put(store, filter_args.cache_key(), row_ids)
+            if explain:
+                self.log.info(f'Filter plan for store "{store.name}" with {len(store)} puzzles:')
+                for line in plan.explain():
+                    self.log.info(line)
+        filtered_opening_tags = filter_args.opening_tags \
+            if filter_args.filter_by_opening_tags \
+            else store.get_openings()
+        return store.create_view(
+            row_ids,
+            filter_args.filtered_store_name,
+            self.calc_filtered_themes(filter_args),
+            filtered_opening_tags
+        )
 
     @staticmethod
-    def filter_dataframe(puzzle_dataframe: DataFrame, filter_args: FilterArgs) -> DataFrame:
-        filtered_dataframe = puzzle_dataframe
+    def build_predicates(filter_args: FilterArgs) -> list[Predicate]:
+        predicates = []
         if filter_args.filter_by_rating:
-            filtered_dataframe = PuzzleStore.filter_by_rating(
-                filtered_dataframe,
-                filter_args.min_rating,
-                filter_args.max_rating
-            )
+            predicates.append(RatingPredicate(filter_args.min_rating, filter_args.max_rating))
         if filter_args.filter_by_themes:
-            filtered_dataframe = PuzzleStore.filter_by_themes_all_match(
-                filtered_dataframe,
-                filter_args.themes
-            )
+            predicates.append(ThemesPredicate(filter_args.themes))
         if filter_args.filter_excluded_themes:
-            filtered_dataframe = PuzzleStore.filter_by_themes_none_match(
-                filtered_dataframe,
-                filter_args.excluded_themes
-            )
+            predicates.append(ExcludedThemesPredicate(filter_args.excluded_themes))
         if filter_args.filter_by_opening_tags:
-            filtered_dataframe = PuzzleStore.filter_by_opening_tags_any_match(
-                filtered_dataframe,
-                filter_args.opening_tags
-            )
+            predicates.append(OpeningTagsPredicate(filter_args.opening_tags))
         if filter_args.filter_by_moves:
-            filtered_dataframe = PuzzleStore.filter_by_moves(
-                filtered_dataframe,
-                filter_args.min_moves,
-                filter_args.max_moves
-            )
-        return filtered_dataframe
+            predicates.append(MovesPredicate(filter_args.min_moves, filter_args.max_moves))
+        return predicates
 
     @staticmethod
     def calc_filtered_themes(filter_args: FilterArgs) -> set[str]:
@@ -240,6 +294,35 @@ class Filter(Command):
         return themes
 
 
+class FilterCache(Lister):
+    """Show the hit and miss counters of the filter result cache or clear it"""
+    def __init__(self, app: PSGApp, app_args):
+        super().__init__(app, app_args, 'filter-cache')
+        self.app = app
+        self.log = logging.getLogger(__name__)
+
+    def get_parser(self, prog_name: str) -> ArgumentParser:
+        parser = super().get_parser(prog_name)
+        parser.add_argument('--clear', action='store_true', help='Remove all cached filter results')
+        return parser
+
+    def take_action(self, parsed_args: Namespace) -> tuple[tuple, tuple]:
+        self.log.debug(f'Running {self.cmd_name} with arguments {parsed_args}')
+        filter_result_cache = self.app.filter_result_cache
+        if parsed_args.clear:
+            filter_result_cache.clear()
+            self.log.info('Cleared the filter result cache.')
+        columns = ('cached results', 'hits', 'disk hits', 'misses', 'on disk')
+        data = (
+            len(filter_result_cache),
+            filter_result_cache.hits,
+            filter_result_cache.disk_hits,
+            filter_result_cache.misses,
+            filter_result_cache.cache_dir is not None
+        )
+        return columns, (data,)
+
+
 class Sample(AutosaveCommand):
     """Create a new sheet or add to a sheet by sampling a given number of puzzles from a store"""
 
@@ -257,14 +340,45 @@ class Sample(AutosaveCommand):
             default=PuzzleSheet.MAX_AMOUNT_OF_PUZZLES,
             help='Number of puzzles to sample'
         )
+        parser.add_argument(
+            '-w', '--weight',
+            choices=tuple(PuzzleSampler.WEIGHT_COLUMNS),
+            help='Prefer popular or often played puzzles, proportional to their popularity or number of plays'
+        )
+        parser.add_argument('-s', '--seed', type=int, help='Seed for drawing the same puzzles again')
+        parser.add_argument(
+            '-u', '--unused',
+            action='store_true',
+            help='Only sample puzzles, that are not on any sheet of this session or any saved sheet'
+        )
+        stratification = parser.add_mutually_exclusive_group()
+        stratification.add_argument(
+            '-b', '--rating-bands',
+            type=int,
+            help='Split the rating range of the store into bands of equal width and sample the same amount from each'
+        )
+        stratification.add_argument(
+            '-t', '--themes',
+            nargs='+',
+            help='Sample the same amount of puzzles with each of the themes'
+        )
         return parser
 
     def take_action(self, parsed_args: Namespace) -> None:
         self.log.debug(f'Running {self.cmd_name} with arguments {parsed_args}')
         store = self.app.puzzle_store_repository.get(parsed_args.store)
         sheet = self.app.puzzle_sheet_repository.get(parsed_args.sheet)
-        if self._validate_args(parsed_args, store, sheet):
-            puzzles = store.sample(parsed_args.amount)
+        excluded_rows = self.app.puzzle_sheet_repository.used_puzzles.get_bitmap(store) \
+            if parsed_args.unused and store is not None \
+            else None
+        if self._validate_args(parsed_args, store, sheet, excluded_rows):
+            puzzles = self.sample(store, excluded_rows, parsed_args)
+            unused = ', that are not on any sheet' if excluded_rows is not None else ''
+            if not puzzles:
+                self.log.error(f'The selected puzzle store {store.get_name()} contains no puzzles{unused}.')
+                return
+            if len(puzzles) < parsed_args.amount:
+                self.log.warning(f'Only {len(puzzles)} puzzles could be sampled{unused}.')
             if sheet is None:
                 sheet = PuzzleSheet(parsed_args.sheet, puzzles)
                 sheet_id = self.app.puzzle_sheet_repository.add(sheet)
@@ -273,13 +387,29 @@ class Sample(AutosaveCommand):
             else:
                 sheet_id = self.app.puzzle_sheet_repository.get_id_for_name(parsed_args.sheet)
                 sheet.add(puzzles)
-                self.log.info(f'Added {parsed_args.amount} puzzles to sheet "{sheet.get_name()}" with id "{sheet_id}".')
-            self.autosave_sheet(sheet, sheet_id)
+                self.log.info(f'Added {len(puzzles)} puzzles to sheet "{sheet.get_name()}" with id "{sheet_id}".')
+            self.sheet_changed(sheet, sheet_id)
 
-    def _validate_args(self, parsed_args: Namespace, store: PuzzleStore | None, sheet: PuzzleSheet | None) -> bool:
+    def _validate_args(
+            self,
+            parsed_args: Namespace,
+            store: PuzzleStore | None,
+            sheet: PuzzleSheet | None,
+            excluded_rows: numpy.ndarray | None
+    ) -> bool:
         if store is None:
             self.log.error(f'There is no store with name "{parsed_args.store}".')
             return False
+        return self._validate_amount(parsed_args, store, sheet, excluded_rows) \
+            and self._validate_stratification(parsed_args)
+
+    def _validate_amount(
+            self,
+            parsed_args: Namespace,
+            store: PuzzleStore,
+            sheet: PuzzleSheet | None,
+            excluded_rows: numpy.ndarray | None
+    ) -> bool:
         if parsed_args.amount <= 0:
             self.log.error('The selected amount of puzzles has to be positive.')
             return False
@@ -293,23 +423,55 @@ class Sample(AutosaveCommand):
             self.log.warning(f'The selected amount of {parsed_args.amount} puzzles, '
                              f'exceeds the free space on this sheet. Only {max_amount} puzzles are sampled.')
             parsed_args.amount = max_amount
-        if parsed_args.amount > len(store):
-            self.log.error(f'The selected puzzle store {store.get_name()} contains only {len(store)} puzzles.')
+        # views are only checked for their size, puzzles that are on sheets are reported after sampling
+        number_of_excluded_rows = self.app.puzzle_sheet_repository.used_puzzles.count_used_rows() \
+            if excluded_rows is not None \
+            else 0
+        available = PuzzleSampler.max_available(store, number_of_excluded_rows)
+        if parsed_args.amount > available:
+            self.log.error(f'The selected puzzle store {store.get_name()} contains only {available} puzzles'
+                           f'{", that are not on any sheet" if excluded_rows is not None else ""}.')
+            return False
         return True
 
+    def _validate_stratification(self, parsed_args: Namespace) -> bool:
+        if parsed_args.rating_bands is not None and parsed_args.rating_bands <= 0:
+            self.log.error('The number of rating bands has to be positive.')
+            return False
+        if parsed_args.themes is not None:
+            for theme in parsed_args.themes:
+                if theme.casefold() not in lichess_puzzle_themes.casefold_puzzle_themes:
+                    self.log.error(f'The puzzle theme "{theme}" is not a lichess puzzle database theme.')
+                    return False
+        return True
 
-class Union(Command):
-    """Unite two puzzle stores to create a mixed set of puzzles"""
-    def __init__(self, app: PSGApp, app_args):
-        super().__init__(app, app_args, 'union')
+    def sample(
+            self,
+            store: PuzzleStore,
+            excluded_rows: numpy.ndarray | None,
+            parsed_args: Namespace
+    ) -> list[LichessPuzzle]:
+        sampler = PuzzleSampler(store, parsed_args.weight, parsed_args.seed, excluded_rows)
+        if parsed_args.rating_bands is not None:
+            return sampler.sample_by_rating_bands(parsed_args.amount, parsed_args.rating_bands)
+        if parsed_args.themes is not None:
+            themes = lichess_puzzle_themes.to_canonical_forms(parsed_args.themes)
+            return sampler.sample_by_themes(parsed_args.amount, themes)
+        return sampler.sample(parsed_args.amount)
+
+
+class StoreSetOperation(Command, metaclass=abc.ABCMeta):
+    """Base class for the commands, that create a new puzzle store from the puzzles of two stores"""
+    def __init__(self, app: PSGApp, app_args, cmd_name: str):
+        super().__init__(app, app_args, cmd_name)
         self.app = app
         self.log = logging.getLogger(__name__)
 
     def get_parser(self, prog_name: str) -> ArgumentParser:
         parser = super().get_parser(prog_name)
-        parser.add_argument('store_1', help='A puzzle store selected for union')
-        parser.add_argument('store_2', help='The other puzzle store selected for union')
-        parser.add_argument('name', help='Name for the new puzzle store that combines the two selected stores puzzles')
+        parser.add_argument('store_1', help=f'A puzzle store selected for {self.cmd_name}')
+        parser.add_argument('store_2', help=f'The other puzzle store selected for {self.cmd_name}')
+        parser.add_argument('name', help='Name for the new puzzle store')
         return parser
 
     def take_action(self, parsed_args: Namespace) -> None:
@@ -317,10 +479,18 @@ class Union(Command):
         store_1 = self.app.puzzle_store_repository.get(parsed_args.store_1)
         store_2 = self.app.puzzle_store_repository.get(parsed_args.store_2)
         if self._validate_args(parsed_args, store_1, store_2):
-            combined_store = store_1.combine(store_2, parsed_args.name)
-            combined_store_id = self.app.puzzle_store_repository.add(combined_store)
-            self.log.info(f'Created new store "{parsed_args.name}" with id "{combined_store_id}" '
-                          f'that contains {len(combined_store.puzzle_df.index)} puzzles.')
+            new_store = self.apply(store_1, store_2, parsed_args.name)
+            if len(new_store) == 0:
+                self.log.error(f'The {self.cmd_name} of the stores "{store_1.name}" and "{store_2.name}" '
+                               f'contains no puzzles.')
+                return
+            new_store_id = self.app.puzzle_store_repository.add(new_store)
+            self.log.info(f'Created new store "{parsed_args.name}" with id "{new_store_id}" '
+                          f'that contains {len(new_store)} puzzles.')
+
+    @abc.abstractmethod
+    def apply(self, store_1: PuzzleStore, store_2: PuzzleStore, name: str) -> PuzzleStore:
+        pass
 
     def _validate_args(self, parsed_args: Namespace, store_1: PuzzleStore | None, store_2: PuzzleStore | None) -> bool:
         """Return True if arguments are valid"""
@@ -341,3 +511,30 @@ class Union(Command):
             self.log.error(f'There is no store with name "{parsed_args.store_1}".')
         if store_2 is None:
             self.log.error(f'There is no store with name "{parsed_args.store_2}".')
+
+
+class Union(StoreSetOperation):
+    """Unite two puzzle stores to create a mixed set of puzzles"""
+    def __init__(self, app: PSGApp, app_args):
+        super().__init__(app, app_args, 'union')
+
+    def apply(self, store_1: PuzzleStore, store_2: PuzzleStore, name: str) -> PuzzleStore:
+        return store_1.union(store_2, name)
+
+
+class Intersect(StoreSetOperation):
+    """Create a store of the puzzles, that are in both puzzle stores"""
+    def __init__(self, app: PSGApp, app_args):
+        super().__init__(app, app_args, 'intersect')
+
+    def apply(self, store_1: PuzzleStore, store_2: PuzzleStore, name: str) -> PuzzleStore:
+        return store_1.intersect(store_2, name)
+
+
+class Subtract(StoreSetOperation):
+    """Create a store of the puzzles in the first puzzle store, that are not in the second one"""
+    def __init__(self, app: PSGApp, app_args):
+        super().__init__(app, app_args, 'subtract')
+
+    def apply(self, store_1: PuzzleStore, store_2: PuzzleStore, name: str) -> PuzzleStore:
+        return store_1.subtract(store_2, name)
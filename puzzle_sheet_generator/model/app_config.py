@@ -2,18 +2,48 @@ import json
 import logging
 from os import PathLike
 from pathlib import Path
+from types import MappingProxyType
 
 import platformdirs
 
+from puzzle_sheet_generator.puzzle_database import lichess_puzzle_db_columns
+
 
 class AppConfig:
     AUTOSAVE_PUZZLE_SHEETS_KEY = 'autosave_puzzle_sheets'
     DIAGRAM_BOARD_COLORS_PATH_KEY = 'diagram_board_colors_path'
+    DIAGRAM_DISK_CACHE_KEY = 'diagram_disk_cache'
+    DIAGRAM_RENDERER_KEY = 'diagram_renderer'
+    FILTER_RESULT_DISK_CACHE_KEY = 'filter_result_disk_cache'
     LICHESS_PUZZLE_DB_KEY = 'lichess_puzzle_db_path'
+    LICHESS_PUZZLE_DB_SCHEMA_KEY = 'lichess_puzzle_db_schema'
+    RENDER_POOL_KEY = 'render_pool'
+    RENDER_WORKERS_KEY = 'render_workers'
+
+    DIAGRAM_RENDERERS = ('svg', 'native')
+    RENDER_POOL_TYPES = ('process', 'thread')
 
-    BOOLEAN_CONFIGS = (AUTOSAVE_PUZZLE_SHEETS_KEY,)
+    BOOLEAN_CONFIGS = (AUTOSAVE_PUZZLE_SHEETS_KEY, DIAGRAM_DISK_CACHE_KEY, FILTER_RESULT_DISK_CACHE_KEY)
     PATH_CONFIGS = (DIAGRAM_BOARD_COLORS_PATH_KEY, LICHESS_PUZZLE_DB_KEY)
-    CONFIG_KEYS = BOOLEAN_CONFIGS + PATH_CONFIGS
+    CHOICE_CONFIGS = MappingProxyType({
+        DIAGRAM_RENDERER_KEY: DIAGRAM_RENDERERS,
+        LICHESS_PUZZLE_DB_SCHEMA_KEY: lichess_puzzle_db_columns.lichess_puzzle_db_schemas,
+        RENDER_POOL_KEY: RENDER_POOL_TYPES,
+    })
+    # non-negative integers
+    INTEGER_CONFIGS = (RENDER_WORKERS_KEY,)
+    CONFIG_KEYS = BOOLEAN_CONFIGS + PATH_CONFIGS + tuple(CHOICE_CONFIGS) + INTEGER_CONFIGS
+
+    # fallback for configuration keys that are missing in configuration files of older versions
+    DEFAULT_VALUES = MappingProxyType({
+        LICHESS_PUZZLE_DB_SCHEMA_KEY: lichess_puzzle_db_columns.COMPACT_SCHEMA,
+        DIAGRAM_DISK_CACHE_KEY: False,
+        DIAGRAM_RENDERER_KEY: 'svg',
+        FILTER_RESULT_DISK_CACHE_KEY: True,
+        RENDER_POOL_KEY: 'process',
+        # one worker per CPU
+        RENDER_WORKERS_KEY: 0,
+    })
 
     def __init__(self, app_name: str):
         self.log = logging.getLogger(__name__)
@@ -22,15 +52,21 @@ class AppConfig:
         self.diagram_board_colors = None
         self.load_configuration()
 
-    def get(self, key: str) -> bool | str:
+    def get(self, key: str) -> bool | int | str:
+        if key in self.DEFAULT_VALUES:
+            return self.config.get(key, self.DEFAULT_VALUES[key])
         return self.config[key]
 
-    def set(self, key: str, value: bool | str) -> bool:
+    def set(self, key: str, value: bool | int | str) -> bool:
         set_success = False
         if key in self.BOOLEAN_CONFIGS:
             set_success = self._set_boolean(key, value)
         if key in self.PATH_CONFIGS:
             set_success = self._set_path_config(key, value)
+        if key in self.CHOICE_CONFIGS:
+            set_success = self._set_choice(key, value)
+        if key in self.INTEGER_CONFIGS:
+            set_success = self._set_integer(key, value)
         if set_success:
             self.save_configuration()
         return set_success
@@ -42,6 +78,13 @@ class AppConfig:
         else:
             return False
 
+    def _set_integer(self, key: str, value) -> bool:
+        if type(value) is int and value >= 0:
+            self.config[key] = value
+            return True
+        else:
+            return False
+
     def _set_path_config(self, key: str, value) -> bool:
         path = Path(str(value))
         if not path.exists():
@@ -50,6 +93,14 @@ class AppConfig:
         self.config[key] = str(value)
         return True
 
+    def _set_choice(self, key: str, value) -> bool:
+        if value not in self.CHOICE_CONFIGS[key]:
+            self.log.warning(f'The given value {value} for configuration key {key} is not one of '
+                             f'{", ".join(self.CHOICE_CONFIGS[key])}.')
+            return False
+        self.config[key] = value
+        return True
+
     def set_diagram_board_colors_from_file(self, board_colors_path: str | PathLike) -> None:
         if self.set(self.DIAGRAM_BOARD_COLORS_PATH_KEY, board_colors_path):
             self._set_diagram_board_colors()
@@ -68,7 +119,8 @@ class AppConfig:
     def set_default_configuration(self) -> None:
         self.config = {
             self.AUTOSAVE_PUZZLE_SHEETS_KEY: True,
-            self.DIAGRAM_BOARD_COLORS_PATH_KEY: 'config/diagram_board_colors.json'
+            self.DIAGRAM_BOARD_COLORS_PATH_KEY: 'config/diagram_board_colors.json',
+            **self.DEFAULT_VALUES
         }
         self._set_diagram_board_colors()
 
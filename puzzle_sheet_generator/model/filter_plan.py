@@ -0,0 +1,192 @@
+import time
+from abc import ABC, abstractmethod
+from collections.abc import Collection
+
+import numpy
+
+from puzzle_sheet_generator.model.puzzle_store import PuzzleStore
+
+
+class Predicate(ABC):
+    """
+    A filter criterion, that selects the matching puzzles from ascending row ids of a puzzle store.
+    The row ids None stand for all puzzles in the store.
+    """
+    # index predicates are answered by binary search or the inverted index, the others scan a column
+    uses_index = False
+
+    @abstractmethod
+    def describe(self) -> str:
+        pass
+
+    @abstractmethod
+    def select(self, store: PuzzleStore, row_ids: numpy.ndarray | None) -> numpy.ndarray:
+        pass
+
+    def estimate_matches(self, store: PuzzleStore, number_of_rows: int, sample: numpy.ndarray) -> float:
+        """
+        Estimate the number of matching puzzles among the candidate rows.
+        :param number_of_rows: number of candidate rows
+        :param sample: sorted random sample of the candidate row ids, scan predicates are evaluated on it
+        """
+        if len(sample) == 0:
+            return 0
+        return len(self.select(store, sample)) / len(sample) * number_of_rows
+
+
+class IndexPredicate(Predicate, ABC):
+    """A predicate answered by an index, the plan orders them by a count that does not evaluate the predicate."""
+    uses_index = True
+
+    @abstractmethod
+    def count_matches(self, store: PuzzleStore) -> int:
+        """The number of matching puzzles in the whole store or an upper bound of it."""
+        pass
+
+
+class RatingPredicate(IndexPredicate):
+
+    def __init__(self, min_rating: int, max_rating: int):
+        self.min_rating = min_rating
+        self.max_rating = max_rating
+
+    def describe(self) -> str:
+        return f'rating {self.min_rating}-{self.max_rating}'
+
+    def select(self, store: PuzzleStore, row_ids: numpy.ndarray | None) -> numpy.ndarray:
+        return store.filter_by_rating(self.min_rating, self.max_rating, row_ids)
+
+    def count_matches(self, store: PuzzleStore) -> int:
+        # exact, the binary search only finds the bounds of the rating range
+        start, end = store.get_rating_positions(self.min_rating, self.max_rating)
+        return end - start
+
+
+class OpeningTagsPredicate(IndexPredicate):
+
+    def __init__(self, opening_tags: Collection[str]):
+        self.opening_tags = opening_tags
+
+    def describe(self) -> str:
+        return f'any opening of {", ".join(sorted(self.opening_tags))}'
+
+    def select(self, store: PuzzleStore, row_ids: numpy.ndarray | None) -> numpy.ndarray:
+        return store.filter_by_opening_tags_any_match(self.opening_tags, row_ids)
+
+    def count_matches(self, store: PuzzleStore) -> int:
+        if store.opening_tag_index is None:
+            return len(store)
+        # the lengths of the posting lists add up to an upper bound, without merging them
+        return min(len(store), sum(len(store.opening_tag_index.get_row_ids(tag)) for tag in self.opening_tags))
+
+
+class ThemesPredicate(Predicate):
+    def __init__(self, themes: Collection[str]):
+        self.themes = themes
+
+    def describe(self) -> str:
+        return f'all themes of {", ".join(sorted(self.themes))}'
+
+    def select(self, store: PuzzleStore, row_ids: numpy.ndarray | None) -> numpy.ndarray:
+        return store.filter_by_themes_all_match(self.themes, row_ids)
+
+
+class ExcludedThemesPredicate(Predicate):
+    def __init__(self, themes: Collection[str]):
+        self.themes = themes
+
+    def describe(self) -> str:
+        return f'none of the themes {", ".join(sorted(self.themes))}'
+
+    def select(self, store: PuzzleStore, row_ids: numpy.ndarray | None) -> numpy.ndarray:
+        return store.filter_by_themes_none_match(self.themes, row_ids)
+
+
+class MovesPredicate(Predicate):
+    def __init__(self, min_moves: int, max_moves: int):
+        self.min_moves = min_moves
+        self.max_moves = max_moves
+
+    def describe(self) -> str:
+        return f'moves {self.min_moves}-{self.max_moves}'
+
+    def select(self, store: PuzzleStore, row_ids: numpy.ndarray | None) -> numpy.ndarray:
+        return store.filter_by_moves(self.min_moves, self.max_moves, row_ids)
+
+
+class PlanStep:
+    """Statistics of executing one predicate of a filter plan."""
+
+    def __init__(self, predicate: Predicate, estimated_matches: float):
+        self.predicate = predicate
+        self.estimated_matches = estimated_matches
+        self.rows_scanned = 0
+        self.rows_matched = 0
+        self.seconds = 0.0
+
+
+class FilterPlan:
+    """
+    Evaluates a conjunction of predicates on a puzzle store in one pass over shrinking candidate row ids.
+    The index predicates come first, ordered by the size of their result as counted from the index without evaluating
+    them. They are followed by the column scans, ordered by their selectivity on a random sample of the remaining
+    candidates, so the most selective scan reads the most rows and every later scan only reads the puzzles that are
+    still left. The result is turned into a store once.
+    """
+    SAMPLE_SIZE = 2048
+    SAMPLE_SEED = 0
+
+    def __init__(self, store: PuzzleStore, predicates: Collection[Predicate]):
+        self.store = store
+        self.index_predicates = [predicate for predicate in predicates if isinstance(predicate, IndexPredicate)]
+        self.scan_predicates = [predicate for predicate in predicates if not isinstance(predicate, IndexPredicate)]
+        self.steps: list[PlanStep] = []
+
+    def execute(self) -> numpy.ndarray:
+        """Return the ascending row ids of the puzzles in the store, that match all predicates."""
+        self.steps = []
+        estimates = [(predicate.count_matches(self.store), predicate) for predicate in self.index_predicates]
+        row_ids = self._execute_steps(sorted(estimates, key=lambda estimate: estimate[0]), None)
+        number_of_rows = self._count(row_ids)
+        sample = self._sample(row_ids)
+        estimates = [(predicate.estimate_matches(self.store, number_of_rows, sample), predicate)
+                     for predicate in self.scan_predicates]
+        row_ids = self._execute_steps(sorted(estimates, key=lambda estimate: estimate[0]), row_ids)
+        return self.store.get_row_ids() if row_ids is None else row_ids
+
+    def _execute_steps(
+            self,
+            estimates: list[tuple[float, Predicate]],
+            row_ids: numpy.ndarray | None
+    ) -> numpy.ndarray | None:
+        for estimated_matches, predicate in estimates:
+            step = PlanStep(predicate, estimated_matches)
+            step.rows_scanned = self._count(row_ids)
+            start = time.perf_counter()
+            if step.rows_scanned > 0:
+                row_ids = predicate.select(self.store, row_ids)
+            step.seconds = time.perf_counter() - start
+            step.rows_matched = self._count(row_ids)
+            self.steps.append(step)
+        return row_ids
+
+    def _count(self, row_ids: numpy.ndarray | None) -> int:
+        return len(self.store) if row_ids is None else len(row_ids)
+
+    def _sample(self, row_ids: numpy.ndarray | None) -> numpy.ndarray:
+        """Sorted random sample of the candidate row ids, the same candidates always give the same sample."""
+        if row_ids is None:
+            row_ids = self.store.get_row_ids()
+        if len(row_ids) <= self.SAMPLE_SIZE:
+            return row_ids
+        positions = numpy.random.default_rng(self.SAMPLE_SEED).choice(len(row_ids), self.SAMPLE_SIZE, replace=False)
+        return row_ids[numpy.sort(positions)]
+
+    def explain(self) -> list[str]:
+        """Describe the executed plan, one line per predicate in the order they were evaluated."""
+        return [
+            f'{number}. {step.predicate.describe()} ({"index" if step.predicate.uses_index else "scan"}): '
+            f'estimated {step.estimated_matches:.0f}, scanned {step.rows_scanned}, matched {step.rows_matched} rows '
+            f'in {step.seconds * 1000:.2f} ms'
+            for number, step in enumerate(self.steps, start=1)
+        ]
@@ -0,0 +1,133 @@
+import hashlib
+import json
+import logging
+import shutil
+import tempfile
+from collections import OrderedDict
+from os import PathLike
+from pathlib import Path
+
+import numpy
+
+from puzzle_sheet_generator.model.puzzle_store import PuzzleStore
+
+
+class FilterResultCache:
+    """
+    Least recently used cache of the row ids, that a filter selected from a puzzle store.
+    The key is the content key of the filtered store together with the normalized filter criteria, so the same
+    filter on the same puzzles is only evaluated once. Results of a database with a snapshot version are also
+    stored on disk, in a directory per snapshot version, so they are reused in later sessions until the database
+    changes.
+    """
+    RESULT_FILE_TYPE = '.npy'
+
+    def __init__(self, max_entries: int = 256, cache_dir: str | PathLike | None = None, max_disk_entries: int = 4096):
+        """
+        :param max_entries: number of filter results kept in memory
+        :param cache_dir: directory for the results on disk, None to only keep the results in memory
+        :param max_disk_entries: number of filter results kept on disk for the current snapshot version
+        """
+        self.log = logging.getLogger(__name__)
+        self.max_entries = max_entries
+        self.cache_dir = Path(cache_dir) if cache_dir is not None else None
+        self.max_disk_entries = max_disk_entries
+        self._results: OrderedDict[str, numpy.ndarray] = OrderedDict()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._results)
+
+    def get(self, store: PuzzleStore, filter_key: tuple) -> numpy.ndarray | None:
+        """
+        :param store: the filtered puzzle store
+        :param filter_key: normalized filter criteria
+        :return: the cached row ids of the filter result or None
+        """
+        key = self._key(store, filter_key)
+        row_ids = self._results.get(key)
+        if row_ids is not None:
+            self._results.move_to_end(key)
+            self.hits += 1
+            return row_ids
+        row_ids = self._load(store.get_database_version(), key)
+        if row_ids is not None:
+            self._remember(key, row_ids)
+            self.disk_hits += 1
+            return row_ids
+        self.misses += 1
+        return None
+
+    def put(self, store: PuzzleStore, filter_key: tuple, row_ids: numpy.ndarray) -> None:
+        key = self._key(store, filter_key)
+        self._remember(key, row_ids)
+        self._store(store.get_database_version(), key, row_ids)
+
+    def clear(self) -> None:
+        """Remove all results from memory and disk and reset the counters."""
+        self._results.clear()
+        self.hits = self.disk_hits = self.misses = 0
+        if self.cache_dir is not None:
+            shutil.rmtree(self.cache_dir, ignore_errors=True)
+
+    def _remember(self, key: str, row_ids: numpy.ndarray) -> None:
+        # stores share the cached row ids, so they must never be changed
+        row_ids.flags.writeable = False
+        self._results[key] = row_ids
+        self._results.move_to_end(key)
+        while len(self._results) > self.max_entries:
+            self._results.popitem(last=False)
+
+    @staticmethod
+    def _key(store: PuzzleStore, filter_key: tuple) -> str:
+        return json.dumps([store.get_content_key(), filter_key])
+
+    def _result_path(self, database_version: str, key: str) -> Path:
+        return self.cache_dir / database_version / (hashlib.sha256(key.encode()).hexdigest() + self.RESULT_FILE_TYPE)
+
+    def _load(self, database_version: str | None, key: str) -> numpy.ndarray | None:
+        if self.cache_dir is None or database_version is None:
+            return None
+        result_path = self._result_path(database_version, key)
+        if not result_path.is_file():
+            return None
+        try:
+            row_ids = numpy.load(result_path)
+            # the modification time orders the results on disk from least to most recently used
+            result_path.touch()
+            return row_ids
+        except (OSError, ValueError) as error:
+            self.log.warning(f'Could not load the cached filter result {result_path}.')
+            self.log.warning(error)
+            return None
+
+    def _store(self, database_version: str | None, key: str, row_ids: numpy.ndarray) -> None:
+        if self.cache_dir is None or database_version is None:
+            return
+        result_path = self._result_path(database_version, key)
+        try:
+            self._remove_other_versions(database_version)
+            result_path.parent.mkdir(parents=True, exist_ok=True)
+            # write to a temporary file first, so other processes never read a partial result
+            with tempfile.NamedTemporaryFile(dir=result_path.parent, suffix='.tmp', delete=False) as temporary_file:
+                numpy.save(temporary_file, row_ids)
+            Path(temporary_file.name).replace(result_path)
+            self._evict_disk_entries(result_path.parent)
+        except OSError as error:
+            self.log.warning(f'Could not save the filter result to {result_path}.')
+            self.log.warning(error)
+
+    def _remove_other_versions(self, database_version: str) -> None:
+        """Results of outdated snapshots are never read again."""
+        if not self.cache_dir.is_dir():
+            return
+        for version_dir in self.cache_dir.iterdir():
+            if version_dir.is_dir() and version_dir.name != database_version:
+                shutil.rmtree(version_dir, ignore_errors=True)
+
+    def _evict_disk_entries(self, version_dir: Path) -> None:
+        result_paths = sorted(version_dir.glob('*' + self.RESULT_FILE_TYPE), key=lambda path: path.stat().st_mtime)
+        for result_path in result_paths[:max(0, len(result_paths) - self.max_disk_entries)]:
+            result_path.unlink(missing_ok=True)
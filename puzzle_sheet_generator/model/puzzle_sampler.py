@@ -0,0 +1,132 @@
+from collections.abc import Collection
+from types import MappingProxyType
+
+import numpy
+
+from puzzle_sheet_generator.model.puzzle_store import PuzzleStore
+from puzzle_sheet_generator.model.sheet_element import LichessPuzzle
+
+
+class PuzzleSampler:
+    """
+    Draws puzzles from a puzzle store without replacement, uniformly or weighted by a column of the puzzle table.
+    The puzzles can be stratified by rating bands or by themes, the amount is split evenly between the strata.
+
+    The sampler draws positions in the store and only reads the rows of the drawn puzzles, excluded puzzles are
+    rejected when they are drawn. A rating band is a range of positions, because the stores are sorted by rating, and
+    weighted draws use the cached running sum of the weights of the store, so a draw from a rating band costs
+    O(amount log n) instead of O(n).
+    """
+    WEIGHT_COLUMNS = MappingProxyType({'popularity': 'Popularity', 'plays': 'NbPlays'})
+    # with fewer free puzzles per requested puzzle, drawing all at once is cheaper than rejecting duplicates
+    REJECTION_SAMPLING_FACTOR = 4
+    MAX_REJECTION_ROUNDS = 8
+
+    def __init__(
+            self,
+            store: PuzzleStore,
+            weight: str | None = None,
+            seed: int | None = None,
+            excluded_rows: numpy.ndarray | None = None
+    ):
+        """
+        :param store: the puzzle store to sample from
+        :param weight: a key of WEIGHT_COLUMNS to weight the puzzles by or None for uniform sampling
+        :param seed: seed of the random generator, the same seed draws the same puzzles from the same store
+        :param excluded_rows: bitmap over the rows of the puzzle table, puzzles of set rows are never drawn
+        """
+        self.store = store
+        self.excluded_rows = excluded_rows
+        self.cumulative_weights = store.get_cumulative_weights(self.WEIGHT_COLUMNS[weight]) \
+            if weight is not None \
+            else None
+        self.rng = numpy.random.default_rng(seed)
+        self._drawn_positions: set[int] = set()
+
+    @staticmethod
+    def max_available(store: PuzzleStore, number_of_excluded_rows: int) -> int:
+        """
+        An upper bound of the number of puzzles of the store, that are not excluded, without looking at its rows.
+        It is exact for a store of a whole puzzle table, the excluded rows may lie outside of a view.
+        """
+        return len(store) if store.is_view() else len(store) - number_of_excluded_rows
+
+    def sample(self, amount: int) -> list[LichessPuzzle]:
+        return self._to_puzzles(self._draw(0, len(self.store), amount))
+
+    def sample_by_rating_bands(self, amount: int, number_of_bands: int) -> list[LichessPuzzle]:
+        """Split the rating range of the store into bands of equal width and draw the same amount from each band."""
+        statistics = self.store.get_statistics()
+        bounds = numpy.linspace(statistics.min_rating, statistics.max_rating + 1, number_of_bands + 1)
+        positions = []
+        for band, band_amount in enumerate(self._split_amount(amount, number_of_bands)):
+            start, end = self.store.get_rating_positions(int(numpy.ceil(bounds[band])),
+                                                         int(numpy.ceil(bounds[band + 1])) - 1)
+            positions += self._draw(start, end, band_amount)
+        return self._to_puzzles(positions)
+
+    def sample_by_themes(self, amount: int, themes: Collection[str]) -> list[LichessPuzzle]:
+        """Draw the same amount of puzzles with each of the themes. Finding the puzzles of a theme scans the store."""
+        positions = []
+        for theme, theme_amount in zip(sorted(themes), self._split_amount(amount, len(themes)), strict=True):
+            theme_positions = self.store.positions_of(self.store.filter_by_themes_all_match([theme]))
+            positions += self._draw_from(theme_positions, theme_amount)
+        return self._to_puzzles(positions)
+
+    @staticmethod
+    def _split_amount(amount: int, number_of_strata: int) -> list[int]:
+        return [amount // number_of_strata + (1 if stratum < amount % number_of_strata else 0)
+                for stratum in range(number_of_strata)]
+
+    def _draw(self, start: int, end: int, amount: int) -> list[int]:
+        """Draw distinct positions from the range of positions, that were not drawn before."""
+        # excluded positions are rejected like drawn ones, a range that is mostly excluded falls back to a full draw
+        free = end - start - sum(1 for position in self._drawn_positions if start <= position < end)
+        if amount * self.REJECTION_SAMPLING_FACTOR > free:
+            return self._draw_from(numpy.arange(start, end), amount)
+        drawn = []
+        for _ in range(self.MAX_REJECTION_ROUNDS):
+            for position in self._without_excluded(self._draw_with_replacement(start, end, 2 * (amount - len(drawn)))):
+                if position not in self._drawn_positions:
+                    self._drawn_positions.add(position)
+                    drawn.append(position)
+                    if len(drawn) == amount:
+                        return drawn
+        # very uneven weights draw the same few puzzles over and over, or most puzzles of the range are excluded
+        return drawn + self._draw_from(numpy.arange(start, end), amount - len(drawn))
+
+    def _draw_with_replacement(self, start: int, end: int, amount: int) -> list[int]:
+        if self.cumulative_weights is None:
+            return self.rng.integers(start, end, amount).tolist()
+        low = self.cumulative_weights[start - 1] if start > 0 else 0
+        targets = self.rng.uniform(low, self.cumulative_weights[end - 1], amount)
+        # the position of a puzzle is drawn, if the target falls into the interval of its weight
+        return numpy.searchsorted(self.cumulative_weights, targets, side='right').tolist()
+
+    def _without_excluded(self, positions: list[int]) -> list[int]:
+        if self.excluded_rows is None:
+            return positions
+        positions = numpy.array(positions, dtype=numpy.int64)
+        return positions[~self.excluded_rows[self.store.row_ids_at(positions)]].tolist()
+
+    def _draw_from(self, positions: numpy.ndarray, amount: int) -> list[int]:
+        """Draw distinct positions from the given positions, that were not drawn before."""
+        positions = numpy.array(
+            [position for position in self._without_excluded(positions.tolist())
+             if position not in self._drawn_positions],
+            dtype=numpy.int64
+        )
+        if len(positions) <= amount:
+            drawn = positions.tolist()
+        else:
+            probabilities = None
+            if self.cumulative_weights is not None:
+                weights = self.cumulative_weights[positions] \
+                    - numpy.where(positions > 0, self.cumulative_weights[positions - 1], 0)
+                probabilities = weights / weights.sum()
+            drawn = self.rng.choice(positions, amount, replace=False, p=probabilities).tolist()
+        self._drawn_positions.update(drawn)
+        return drawn
+
+    def _to_puzzles(self, positions: list[int]) -> list[LichessPuzzle]:
+        return self.store.get_puzzles_by_row_ids(self.store.row_ids_at(numpy.array(positions, dtype=numpy.int64)))
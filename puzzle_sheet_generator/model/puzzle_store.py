@@ -1,42 +1,188 @@
-from collections.abc import Collection
+import bisect
+import hashlib
+from collections import namedtuple
+from collections.abc import Callable, Collection, Iterable, Sequence
 from numbers import Number
 from typing import Self
 
+import numpy
 import pandas
 
 from puzzle_sheet_generator.model.sheet_element import LichessPuzzle
+from puzzle_sheet_generator.model.store_statistics import StoreStatistics
 from puzzle_sheet_generator.puzzle_database import lichess_puzzle_themes
+from puzzle_sheet_generator.puzzle_database.opening_tag_index import OpeningTagIndex
+
+# the store that owns the puzzle table and the ascending row ids of the puzzles of a view in it
+StoreView = namedtuple('StoreView', ('base_store', 'row_ids'))
 
 
 class PuzzleStore:
+    """
+    A set of puzzles from the Lichess puzzle database.
+    A store either owns the puzzle table of the database or is a view of such a base store, that only holds the
+    row ids of its puzzles in the puzzle table (4 bytes per puzzle). The dataframe of a view is materialized on demand.
+
+    Row ids are kept in ascending order and the puzzle table is sorted by rating, so every store is sorted by rating.
+    The rating queries rely on that order. The filter methods return the ascending row ids of the matching puzzles,
+    either of the whole store or of the given ascending row ids, which have to be puzzles of the store.
+    Stores never change their puzzles, so their statistics are computed once, when the store is created.
+    """
     max_themes_for_display = 4
+    # set operations sort the row ids, unless the stores are large enough for a linear merge of bitmaps to be faster
+    SORTED_MERGE_FACTOR = 16
 
     def __init__(
             self,
             puzzle_df: pandas.DataFrame,
             name: str,
             themes: set[str] | None = None,
-            opening_tags: set[str] | None = None
+            opening_tags: set[str] | None = None,
+            *,
+            view: StoreView | None = None
     ):
-        self.puzzle_df = puzzle_df
+        """
+        :param puzzle_df: the puzzle table, its index labels are the row ids
+        :param name: name of the store
+        :param themes: themes the puzzles in the store were filtered by
+        :param opening_tags: opening tags the puzzles in the store were filtered by
+        :param view: for a view, the store that owns the puzzle table and the row ids of the view's puzzles
+        """
+        self._puzzle_table = puzzle_df
+        self._row_ids = view.row_ids if view is not None else None
+        self._base_store = view.base_store if view is not None else self
         self.name = name
         self._themes = themes if themes is not None else lichess_puzzle_themes.all_puzzle_themes
         self._opening_tags = opening_tags if opening_tags is not None else {'mixed'}
+        self.opening_tag_index: OpeningTagIndex | None = \
+            view.base_store.opening_tag_index if view is not None else None
+        self._puzzle_id_index: pandas.Index | None = None
+        # identifies the content of the puzzle table across sessions, None if it is only known in this session
+        self.database_version: str | None = None
+        self._content_key: str | None = None
+        self._cumulative_weights: dict[str, numpy.ndarray] = {}
+        self.statistics = StoreStatistics(
+            self.get_column('Rating'),
+            [self.get_column(column_name) for column_name in lichess_puzzle_themes.theme_mask_column_names],
+            self.get_column('NbMoves')
+        )
 
     def __len__(self) -> int:
-        return self.puzzle_df.__len__()
+        return len(self._puzzle_table.index) if self._row_ids is None else len(self._row_ids)
 
-    def combine(self, other_store: Self, name: str) -> Self:
-        """Create a new puzzle store, that combines this and the other puzzle stores puzzles into one store."""
-        combined_df = self.puzzle_df.combine_first(other_store.puzzle_df)
-        combined_opening_tags = self.combine_tags(self._opening_tags, other_store.opening_tags)
+    @property
+    def puzzle_df(self) -> pandas.DataFrame:
+        """The puzzles of this store, a view materializes a copy of its puzzles from the puzzle table."""
+        return self._puzzle_table if self._row_ids is None else self._puzzle_table.iloc[self._row_ids]
+
+    def get_base_store(self) -> Self:
+        return self._base_store
+
+    def is_view(self) -> bool:
+        return self._row_ids is not None
+
+    def create_view(
+            self,
+            row_ids: numpy.ndarray,
+            name: str,
+            themes: set[str] | None = None,
+            opening_tags: set[str] | None = None
+    ) -> Self:
+        """
+        Create a store of a subset of this store's puzzles, without copying the puzzle data.
+        :param row_ids: ascending row ids of the puzzles in the new store, as returned by the filter methods
+        """
         return PuzzleStore(
-            combined_df,
+            self._puzzle_table,
+            name,
+            themes if themes is not None else self._themes,
+            opening_tags if opening_tags is not None else self._opening_tags,
+            view=StoreView(self._base_store, row_ids.astype(numpy.int32, copy=False))
+        )
+
+    def get_row_ids(self) -> numpy.ndarray:
+        if self._row_ids is None:
+            return numpy.arange(len(self._puzzle_table.index), dtype=numpy.int32)
+        return self._row_ids
+
+    def get_database_version(self) -> str | None:
+        return self._base_store.database_version
+
+    def get_content_key(self) -> str:
+        """Identifies the puzzles of this store, stores with the same puzzles from the same database share the key."""
+        if self._content_key is None:
+            base_key = self.get_database_version() or f'session-{id(self._base_store)}'
+            self._content_key = base_key \
+                if self._row_ids is None \
+                else f'{base_key}:{hashlib.sha256(self._row_ids.tobytes()).hexdigest()[:32]}'
+        return self._content_key
+
+    def get_column(self, column_name: str, row_ids: numpy.ndarray | None = None) -> numpy.ndarray:
+        """The values of a numeric column for the given rows or the puzzles in this store."""
+        column = self._puzzle_table[column_name].to_numpy()
+        row_ids = self._row_ids if row_ids is None else row_ids
+        return column if row_ids is None else column[row_ids]
+
+    def union(self, other_store: Self, name: str) -> Self:
+        """Create a new puzzle store, that combines this and the other puzzle stores puzzles into one store."""
+        row_ids = self._merge_row_ids(other_store, numpy.logical_or, numpy.union1d)
+        return self._base_store.create_view(
+            row_ids,
             name,
             self._themes.union(other_store._themes),
-            combined_opening_tags
+            self.combine_tags(self._opening_tags, other_store._opening_tags)
+        )
+
+    def intersect(self, other_store: Self, name: str) -> Self:
+        """Create a new puzzle store of the puzzles, that are in this and in the other puzzle store."""
+        row_ids = self._merge_row_ids(
+            other_store,
+            numpy.logical_and,
+            lambda own, other: numpy.intersect1d(own, other, assume_unique=True)
+        )
+        return self._base_store.create_view(
+            row_ids,
+            name,
+            self._themes.intersection(other_store._themes),
+            self.intersect_tags(self._opening_tags, other_store._opening_tags)
         )
 
+    def subtract(self, other_store: Self, name: str) -> Self:
+        """Create a new puzzle store of the puzzles in this puzzle store, that are not in the other puzzle store."""
+        row_ids = self._merge_row_ids(
+            other_store,
+            lambda own, other: own & ~other,
+            lambda own, other: numpy.setdiff1d(own, other, assume_unique=True)
+        )
+        return self._base_store.create_view(row_ids, name, self._themes, self._opening_tags)
+
+    def _merge_row_ids(self, other_store: Self, combine_bitmaps: Callable, merge_sorted: Callable) -> numpy.ndarray:
+        """
+        Combine the row ids of this and the other store, which are unique and sorted.
+        Large stores are merged as bitmaps over the puzzle table in linear time, small stores by sorting their row ids.
+        """
+        own_row_ids = self.get_row_ids()
+        other_row_ids = self._to_own_row_ids(other_store)
+        table_size = len(self._puzzle_table.index)
+        if (len(own_row_ids) + len(other_row_ids)) * self.SORTED_MERGE_FACTOR < table_size:
+            return merge_sorted(own_row_ids, other_row_ids).astype(numpy.int32, copy=False)
+        own_bitmap = numpy.zeros(table_size, dtype=bool)
+        own_bitmap[own_row_ids] = True
+        other_bitmap = numpy.zeros(table_size, dtype=bool)
+        other_bitmap[other_row_ids] = True
+        return numpy.flatnonzero(combine_bitmaps(own_bitmap, other_bitmap)).astype(numpy.int32)
+
+    def _to_own_row_ids(self, other_store: Self) -> numpy.ndarray:
+        """
+        The row ids of the other store's puzzles in the puzzle table of this store.
+        Stores of a reloaded puzzle database have a different puzzle table, their puzzles are matched by PuzzleId.
+        """
+        if other_store._base_store is self._base_store:
+            return other_store.get_row_ids()
+        other_puzzle_ids = other_store._puzzle_table['PuzzleId'].to_numpy()[other_store.get_row_ids()]
+        row_ids = self._base_store._get_puzzle_id_index().get_indexer(other_puzzle_ids)
+        return numpy.sort(row_ids[row_ids >= 0]).astype(numpy.int32)
+
     def get_name(self) -> str:
         return self.name
 
@@ -49,90 +195,212 @@ class PuzzleStore:
     def get_openings(self) -> set[str]:
         return self._opening_tags
 
-    def get_min_rating(self) -> int:
-        return self.puzzle_df['Rating'].min()
+    def get_min_rating(self) -> int | None:
+        return self.statistics.min_rating
 
-    def get_max_rating(self) -> int:
-        return self.puzzle_df['Rating'].max()
+    def get_max_rating(self) -> int | None:
+        return self.statistics.max_rating
 
-    def get_median_rating(self) -> Number:
-        return self.puzzle_df['Rating'].median()
+    def get_median_rating(self) -> Number | None:
+        return self.statistics.median_rating
+
+    def get_statistics(self) -> StoreStatistics:
+        return self.statistics
+
+    def get_memory_footprint(self) -> int:
+        """Memory used by this store in bytes, for a view only its row ids."""
+        if self._row_ids is not None:
+            return self._row_ids.nbytes
+        return int(self._puzzle_table.memory_usage(deep=True).sum())
 
     def get_puzzle_by_id(self, puzzle_id: str) -> LichessPuzzle | None:
-        puzzle_data = self.puzzle_df[self.puzzle_df['PuzzleId'] == puzzle_id]
-        if puzzle_data is not None and not puzzle_data.empty:
-            assert len(puzzle_data.index) == 1
-            return LichessPuzzle(next(puzzle_data.itertuples(index=False)))
-        else:
-            return None
-
-    def sample(self, amount: int) -> list[LichessPuzzle]:
-        puzzle_sample = []
-        for puzzle in self.puzzle_df.sample(amount).itertuples(index=False):
-            puzzle_sample.append(LichessPuzzle(puzzle))
-        return puzzle_sample
+        return self.get_puzzles_by_ids([puzzle_id])[0]
 
-    @staticmethod
-    def filter_by_rating(puzzles_df: pandas.DataFrame, min_rating: int, max_rating: int) -> pandas.DataFrame:
-        return puzzles_df[(puzzles_df['Rating'] >= min_rating)
-                          & (puzzles_df['Rating'] <= max_rating)]
+    def get_puzzles_by_ids(self, puzzle_ids: Sequence[str]) -> list[LichessPuzzle | None]:
+        """
+        Look up multiple puzzles at once in the puzzle id hash index.
+        :param puzzle_ids: Lichess puzzle ids
+        :return: the puzzle for each id in the same order, None for the ids that are not in this store
+        """
+        puzzles: list[LichessPuzzle | None] = [None] * len(puzzle_ids)
+        if len(puzzle_ids) == 0:
+            return puzzles
+        row_ids = self.get_row_ids_of_puzzle_ids(puzzle_ids)
+        found = row_ids >= 0
+        if self._row_ids is not None and len(self._row_ids) > 0:
+            positions = numpy.minimum(numpy.searchsorted(self._row_ids, row_ids), len(self._row_ids) - 1)
+            found &= self._row_ids[positions] == row_ids
+        elif self._row_ids is not None:
+            found[:] = False
+        found = numpy.flatnonzero(found)
+        puzzle_tuples = self._puzzle_table.iloc[row_ids[found]].itertuples(index=False)
+        for index, puzzle_tuple in zip(found, puzzle_tuples, strict=True):
+            puzzles[index] = LichessPuzzle(puzzle_tuple)
+        return puzzles
 
-    @staticmethod
-    def filter_by_moves(puzzles_df: pandas.DataFrame, min_moves: int, max_moves: int) -> pandas.DataFrame:
-        return puzzles_df[((puzzles_df['Moves'].str.count(' ') + 1) // 2 >= min_moves)
-                          & ((puzzles_df['Moves'].str.count(' ') + 1) // 2 <= max_moves)]
+    def get_row_ids_of_puzzle_ids(self, puzzle_ids: Sequence[str]) -> numpy.ndarray:
+        """Row ids of the puzzles in the puzzle table, -1 for the ids that are not in the puzzle table."""
+        return self._base_store._get_puzzle_id_index().get_indexer(puzzle_ids)
 
-    @staticmethod
-    def filter_by_themes_any_match(puzzles_df: pandas.DataFrame, themes: Collection[str]) -> pandas.DataFrame:
-        regex_pattern = PuzzleStore.build_regex_pattern(themes)
-        return puzzles_df[puzzles_df['Themes'].str.contains(regex_pattern)]
+    def _get_puzzle_id_index(self) -> pandas.Index:
+        """Hash index from puzzle id to the row id in the puzzle table, built on first use."""
+        if self._puzzle_id_index is None:
+            self._puzzle_id_index = pandas.Index(self._puzzle_table['PuzzleId'])
+        return self._puzzle_id_index
 
-    @staticmethod
-    def filter_by_themes_all_match(puzzles_df: pandas.DataFrame, themes: Collection[str]) -> pandas.DataFrame:
-        regex_pattern = PuzzleStore.build_regex_pattern(themes)
-        expected_matches = len(themes)
-        return puzzles_df[puzzles_df['Themes'].str.count(regex_pattern) == expected_matches]
+    def get_puzzles_by_row_ids(self, row_ids: numpy.ndarray) -> list[LichessPuzzle]:
+        """Create the puzzles of the given row ids, only these rows of the puzzle table are read."""
+        return [LichessPuzzle(puzzle) for puzzle in self._puzzle_table.iloc[row_ids].itertuples(index=False)]
 
-    @staticmethod
-    def filter_by_themes_none_match(puzzles_df: pandas.DataFrame, themes: Collection[str]) -> pandas.DataFrame:
-        regex_pattern = PuzzleStore.build_none_match_regex_pattern(themes)
-        return puzzles_df[puzzles_df['Themes'].str.match(regex_pattern)]
+    def row_ids_at(self, positions: numpy.ndarray) -> numpy.ndarray:
+        """Row ids of the puzzles at the given positions in this store."""
+        return positions.astype(numpy.int32) if self._row_ids is None else self._row_ids[positions]
+
+    def positions_of(self, row_ids: numpy.ndarray) -> numpy.ndarray:
+        """Positions in this store of the given ascending row ids of its puzzles."""
+        return row_ids if self._row_ids is None else numpy.searchsorted(self._row_ids, row_ids)
+
+    def get_cumulative_weights(self, column_name: str) -> numpy.ndarray:
+        """
+        Running sum over the positions of this store of a numeric column, that is used as sampling weight.
+        Every puzzle has a weight of at least 1. Computed once per store and column.
+        """
+        if column_name not in self._cumulative_weights:
+            weights = numpy.maximum(self.get_column(column_name), 1).astype(numpy.int64)
+            self._cumulative_weights[column_name] = numpy.cumsum(weights)
+        return self._cumulative_weights[column_name]
+
+    def get_rating_positions(
+            self,
+            min_rating: int,
+            max_rating: int,
+            row_ids: numpy.ndarray | None = None
+    ) -> tuple[int, int]:
+        """Start and end position of the rating range in the given rows or this store."""
+        # the puzzles are sorted by rating, so the rating range is a contiguous slice found by binary search
+        ratings = self._puzzle_table['Rating'].to_numpy()
+        row_ids = self._row_ids if row_ids is None else row_ids
+        if row_ids is None:
+            return (int(numpy.searchsorted(ratings, min_rating, side='left')),
+                    int(numpy.searchsorted(ratings, max_rating, side='right')))
+        return (bisect.bisect_left(row_ids, min_rating, key=lambda row_id: ratings[row_id]),
+                bisect.bisect_right(row_ids, max_rating, key=lambda row_id: ratings[row_id]))
+
+    def filter_by_rating(self, min_rating: int, max_rating: int, row_ids: numpy.ndarray | None = None) -> numpy.ndarray:
+        start, end = self.get_rating_positions(min_rating, max_rating, row_ids)
+        row_ids = self._row_ids if row_ids is None else row_ids
+        return numpy.arange(start, end, dtype=numpy.int32) if row_ids is None else row_ids[start:end]
+
+    def filter_by_moves(self, min_moves: int, max_moves: int, row_ids: numpy.ndarray | None = None) -> numpy.ndarray:
+        number_of_moves = self.get_column('NbMoves', row_ids)
+        return self._select((number_of_moves >= min_moves) & (number_of_moves <= max_moves), row_ids)
+
+    def filter_by_themes_any_match(
+            self,
+            themes: Collection[str],
+            row_ids: numpy.ndarray | None = None
+    ) -> numpy.ndarray:
+        selection = numpy.zeros(self._count(row_ids), dtype=bool)
+        for theme_masks, query_mask in self._theme_masks_with_query(themes, row_ids):
+            selection |= (theme_masks & query_mask) != 0
+        return self._select(selection, row_ids)
+
+    def filter_by_themes_all_match(
+            self,
+            themes: Collection[str],
+            row_ids: numpy.ndarray | None = None
+    ) -> numpy.ndarray:
+        selection = numpy.ones(self._count(row_ids), dtype=bool)
+        for theme_masks, query_mask in self._theme_masks_with_query(themes, row_ids):
+            selection &= (theme_masks & query_mask) == query_mask
+        return self._select(selection, row_ids)
+
+    def filter_by_themes_none_match(
+            self,
+            themes: Collection[str],
+            row_ids: numpy.ndarray | None = None
+    ) -> numpy.ndarray:
+        selection = numpy.ones(self._count(row_ids), dtype=bool)
+        for theme_masks, query_mask in self._theme_masks_with_query(themes, row_ids):
+            selection &= (theme_masks & query_mask) == 0
+        return self._select(selection, row_ids)
+
+    def _theme_masks_with_query(
+            self,
+            themes: Collection[str],
+            row_ids: numpy.ndarray | None
+    ) -> list[tuple[numpy.ndarray, numpy.uint64]]:
+        """Pairs of theme bitmask column and the bitmask of the given themes for that column."""
+        for theme in themes:
+            if theme not in lichess_puzzle_themes.theme_bit_positions:
+                raise ValueError(f'The puzzle theme "{theme}" is not a lichess puzzle database theme.')
+        query = lichess_puzzle_themes.to_theme_mask(themes)
+        return [
+            (self.get_column(column_name, row_ids), numpy.uint64(query_mask))
+            for column_name, query_mask in zip(lichess_puzzle_themes.theme_mask_column_names, query, strict=True)
+            if query_mask != 0
+        ]
 
-    @staticmethod
     def filter_by_opening_tags_any_match(
-            puzzles_df: pandas.DataFrame,
-            opening_tags: Collection[str]
-    ) -> pandas.DataFrame:
-        regex_pattern = PuzzleStore.build_regex_pattern(opening_tags)
-        return puzzles_df[puzzles_df['OpeningTags'].str.contains(regex_pattern)]
+            self,
+            opening_tags: Collection[str],
+            row_ids: numpy.ndarray | None = None
+    ) -> numpy.ndarray:
+        if self.opening_tag_index is None:
+            return self._scan_opening_tags(opening_tags, row_ids, any)
+        return self._intersect(self.opening_tag_index.any_match(opening_tags), row_ids)
 
-    @staticmethod
     def filter_by_opening_tags_all_match(
-            puzzles_df: pandas.DataFrame,
-            opening_tags: Collection[str]
-    ) -> pandas.DataFrame:
-        regex_pattern = PuzzleStore.build_regex_pattern(opening_tags)
-        expected_matches = len(opening_tags)
-        return puzzles_df[puzzles_df['OpeningTags'].str.count(regex_pattern) == expected_matches]
+            self,
+            opening_tags: Collection[str],
+            row_ids: numpy.ndarray | None = None
+    ) -> numpy.ndarray:
+        if self.opening_tag_index is None:
+            return self._scan_opening_tags(opening_tags, row_ids, all)
+        return self._intersect(self.opening_tag_index.all_match(opening_tags), row_ids)
 
-    @staticmethod
-    def build_regex_pattern(tags: Collection[str]) -> str:
-        regex = r''
-        for index, tag in enumerate(tags):
-            # \b matches the word boundary, i.e. non-alpha-numerical and whitespace characters,
-            # as well as beginning and end of a line
-            if index != 0:
-                regex += r'|'
-            regex += r'\b' + tag + r'\b'
-        return regex
+    def _scan_opening_tags(
+            self,
+            opening_tags: Collection[str],
+            row_ids: numpy.ndarray | None,
+            match: Callable[[Iterable[bool]], bool]
+    ) -> numpy.ndarray:
+        """Select by the OpeningTags column, for stores without an opening tag index."""
+        column = self._puzzle_table['OpeningTags'].to_numpy()
+        selected_row_ids = self._row_ids if row_ids is None else row_ids
+        puzzle_tags = column if selected_row_ids is None else column[selected_row_ids]
+        selection = numpy.fromiter(
+            (bool(opening_tags) and isinstance(tags, str) and match(tag in tags.split(' ') for tag in opening_tags)
+             for tags in puzzle_tags),
+            dtype=bool,
+            count=len(puzzle_tags)
+        )
+        return self._select(selection, row_ids)
 
-    @staticmethod
-    def build_none_match_regex_pattern(tags: Collection[str]) ->str:
-        # negative lookahead assertion with (?! ... )
-        return r'(?!.*(?:' + '|'.join(r'\b' + tag + r'\b' for tag in tags) + r'))'
+    def _count(self, row_ids: numpy.ndarray | None) -> int:
+        return len(self) if row_ids is None else len(row_ids)
+
+    def _select(self, selection: numpy.ndarray, row_ids: numpy.ndarray | None = None) -> numpy.ndarray:
+        """Row ids of the puzzles selected by a boolean mask over the given rows or this store."""
+        row_ids = self._row_ids if row_ids is None else row_ids
+        return numpy.flatnonzero(selection).astype(numpy.int32) if row_ids is None else row_ids[selection]
+
+    def _intersect(self, index_row_ids: numpy.ndarray, row_ids: numpy.ndarray | None = None) -> numpy.ndarray:
+        """The ascending row ids from an index, that are in the given rows or this store."""
+        row_ids = self._row_ids if row_ids is None else row_ids
+        return index_row_ids if row_ids is None else numpy.intersect1d(row_ids, index_row_ids, assume_unique=True)
 
     @staticmethod
     def combine_tags(own_tags: set[str], other_tags: set[str]) -> set[str]:
         return {'mixed'} \
             if 'mixed' in own_tags or 'mixed' in other_tags \
             else own_tags.union(other_tags)
+
+    @staticmethod
+    def intersect_tags(own_tags: set[str], other_tags: set[str]) -> set[str]:
+        if 'mixed' in own_tags:
+            return other_tags
+        if 'mixed' in other_tags:
+            return own_tags
+        # puzzles can have several tags, so the puzzles of disjoint sets may still match, but neither set holds for all
+        return own_tags.intersection(other_tags) or {'mixed'}
@@ -1,7 +1,11 @@
+import logging
+from concurrent.futures import Future
 from typing import Generic, TypeVar
 
 from puzzle_sheet_generator.model.puzzle_sheet import PuzzleSheet
 from puzzle_sheet_generator.model.puzzle_store import PuzzleStore
+from puzzle_sheet_generator.model.used_puzzles import UsedPuzzles
+from puzzle_sheet_generator.puzzle_database.lichess_puzzle_db import LichessPuzzleDB
 
 T = TypeVar('T', type(PuzzleSheet), type(PuzzleStore))
 
@@ -34,10 +38,13 @@ class Repository(Generic[T]):
         if name in self.items:
             return name
         for element_id, element in self.items.items():
-            if element.get_name() == name:
+            if self._get_name(element) == name:
                 return element_id
         return None
 
+    def _get_name(self, element: T) -> str | None:
+        return element.get_name()
+
     def get_by_id(self, element_id: str) -> T | None:
         return self.items.get(element_id)
 
@@ -46,21 +53,61 @@ class Repository(Generic[T]):
 
 
 class PuzzleStoreRepository(Repository[PuzzleStore]):
-    def __init__(self, id_prefix: str, main_store: PuzzleStore):
+    """
+    Repository of the puzzle stores, the first store is the Lichess puzzle database.
+    The database may still be loading in the background, commands that access it wait until it is loaded.
+    """
+    def __init__(self, id_prefix: str, main_store: PuzzleStore | Future | None):
         super().__init__(id_prefix, [main_store])
+        self.log = logging.getLogger(__name__)
         self.lichess_db_key = self.id_prefix + "0"
 
+    def get_by_id(self, element_id: str) -> PuzzleStore | None:
+        if element_id == self.lichess_db_key:
+            return self.get_main_store()
+        return super().get_by_id(element_id)
+
+    def _get_name(self, element: PuzzleStore | Future | None) -> str | None:
+        if isinstance(element, Future):
+            return LichessPuzzleDB.NAME
+        return element.get_name() if element is not None else None
+
     def delete_by_id(self, element_id) -> None:
         if element_id == self.lichess_db_key:
             raise Exception("Can't delete the Lichess Puzzle Database.")
         del self.items[element_id]
 
-    def get_main_store(self) -> PuzzleStore:
-        return self.items[self.lichess_db_key]
+    def get_main_store(self) -> PuzzleStore | None:
+        main_store = self.items[self.lichess_db_key]
+        if isinstance(main_store, Future):
+            if not main_store.done():
+                self.log.info('Waiting for the Lichess Puzzle Database to be loaded.')
+            main_store = main_store.result()
+            self.items[self.lichess_db_key] = main_store
+        return main_store
+
+    def is_main_store_loaded(self) -> bool:
+        main_store = self.items[self.lichess_db_key]
+        return not isinstance(main_store, Future) or main_store.done()
 
-    def reset_main_store(self, main_store: PuzzleStore) -> None:
+    def reset_main_store(self, main_store: PuzzleStore | Future | None) -> None:
         self.items[self.lichess_db_key] = main_store
 
 class PuzzleSheetRepository(Repository[PuzzleSheet]):
-    def __init__(self, id_prefix: str):
+    """Repository of the puzzle sheets of this session, that registers the puzzles on its sheets as used."""
+    def __init__(self, id_prefix: str, used_puzzles: UsedPuzzles | None = None):
+        self.used_puzzles = used_puzzles if used_puzzles is not None else UsedPuzzles()
         super().__init__(id_prefix)
+
+    def add(self, item: PuzzleSheet) -> str:
+        element_id = super().add(item)
+        self.used_puzzles.update_session_sheet(element_id, item)
+        return element_id
+
+    def delete_by_id(self, element_id) -> None:
+        super().delete_by_id(element_id)
+        self.used_puzzles.remove_session_sheet(element_id)
+
+    def sheet_changed(self, element_id: str) -> None:
+        """Update the used puzzles after elements were added to or removed from the sheet."""
+        self.used_puzzles.update_session_sheet(element_id, self.items[element_id])
@@ -5,9 +5,15 @@ import chess
 import chess.svg
 
 from puzzle_sheet_generator.model.app_config import AppConfig
-from puzzle_sheet_generator.puzzle_database.lichess_puzzle_db_columns import lichess_puzzle_db_column_names
+from puzzle_sheet_generator.puzzle_database.lichess_puzzle_db_columns import (
+    lichess_puzzle_db_column_names,
+    lichess_puzzle_db_computed_column_names,
+)
 
-PuzzleTuple = namedtuple('PuzzleTuple', ' '.join(lichess_puzzle_db_column_names))
+PuzzleTuple = namedtuple(
+    'PuzzleTuple',
+    ' '.join(lichess_puzzle_db_column_names + lichess_puzzle_db_computed_column_names)
+)
 
 
 class SheetElement(ABC):
@@ -52,18 +58,20 @@ class LichessPuzzle(SheetElement):
         self.board.push(first_move)
 
         self.rating = puzzle_tuple.Rating
-        self.rating_deviation = puzzle_tuple.RatingDeviation
+        # the minimal database schema drops the columns that are not needed after loading the database
+        self.rating_deviation = getattr(puzzle_tuple, 'RatingDeviation', None)
         self.popularity = puzzle_tuple.Popularity
         self.nb_plays = puzzle_tuple.NbPlays
         self.themes = puzzle_tuple.Themes
-        self.game_url = puzzle_tuple.GameUrl
+        self.game_url = getattr(puzzle_tuple, 'GameUrl', None)
         self.opening_tags = puzzle_tuple.OpeningTags
+        self.number_of_moves = puzzle_tuple.NbMoves
 
     def get_fen(self) -> str:
         return self.board.fen()
 
     def get_number_of_moves(self) -> int:
-        return (self.moves.count(' ') + 1) // 2
+        return self.number_of_moves
 
     def get_side_to_move(self) -> bool:
         return self.board.turn
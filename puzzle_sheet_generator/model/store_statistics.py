@@ -0,0 +1,58 @@
+from collections.abc import Sequence
+from numbers import Number
+
+import numpy
+
+from puzzle_sheet_generator.puzzle_database import lichess_puzzle_themes
+
+
+class StoreStatistics:
+    """Summary of the ratings, themes and solution lengths of the puzzles in a puzzle store."""
+    QUANTILES = (0.1, 0.25, 0.5, 0.75, 0.9)
+
+    def __init__(self, ratings: numpy.ndarray, theme_masks: Sequence[numpy.ndarray], number_of_moves: numpy.ndarray):
+        """
+        :param ratings: the ratings of the puzzles in ascending order
+        :param theme_masks: the theme bitmask columns of the puzzles
+        :param number_of_moves: the number of solution moves of the puzzles
+        """
+        self.count = len(ratings)
+        self.min_rating = int(ratings[0]) if self.count > 0 else None
+        self.max_rating = int(ratings[-1]) if self.count > 0 else None
+        self.rating_quantiles: dict[float, Number | None] = {
+            quantile: self._quantile_of_sorted(ratings, quantile) for quantile in self.QUANTILES
+        }
+        self.median_rating = self.rating_quantiles[0.5]
+        self.theme_histogram = self._theme_histogram(theme_masks)
+        self.moves_histogram = {
+            moves: int(count) for moves, count in enumerate(numpy.bincount(number_of_moves)) if count > 0
+        } if self.count > 0 else {}
+
+    @staticmethod
+    def _quantile_of_sorted(values: numpy.ndarray, quantile: float) -> Number | None:
+        """Linear interpolation between the closest ranks, like numpy.quantile, without a pass over the values."""
+        if len(values) == 0:
+            return None
+        position = quantile * (len(values) - 1)
+        lower = int(position)
+        upper = min(lower + 1, len(values) - 1)
+        value = int(values[lower]) + (position - lower) * (int(values[upper]) - int(values[lower]))
+        return int(value) if value == int(value) else value
+
+    @staticmethod
+    def _theme_histogram(theme_masks: Sequence[numpy.ndarray]) -> dict[str, int]:
+        """Number of puzzles per theme, most frequent theme first."""
+        histogram = {}
+        for column_index, masks in enumerate(theme_masks):
+            # far fewer distinct theme combinations than puzzles, so the bits are counted per combination
+            unique_masks, counts = numpy.unique(masks, return_counts=True)
+            for theme, bit_position in lichess_puzzle_themes.theme_bit_positions.items():
+                column, bit = divmod(bit_position, lichess_puzzle_themes.THEME_MASK_BITS_PER_COLUMN)
+                if column == column_index:
+                    count = int(counts[(unique_masks & numpy.uint64(1 << bit)) != 0].sum())
+                    if count > 0:
+                        histogram[theme] = count
+        return dict(sorted(histogram.items(), key=lambda item: item[1], reverse=True))
+
+    def get_top_themes(self, amount: int) -> dict[str, int]:
+        return dict(list(self.theme_histogram.items())[:amount])
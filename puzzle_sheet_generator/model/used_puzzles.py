@@ -0,0 +1,135 @@
+import json
+import logging
+from collections import Counter
+from collections.abc import Iterable, Mapping
+from os import PathLike
+from pathlib import Path
+
+import numpy
+
+from puzzle_sheet_generator.model.puzzle_sheet import PuzzleSheet
+from puzzle_sheet_generator.model.puzzle_store import PuzzleStore
+from puzzle_sheet_generator.model.sheet_element import LichessPuzzle
+
+
+class UsedPuzzles:
+    """
+    Keeps track of the Lichess puzzles on the sheets of this session and on the saved sheets.
+    Every sheet is registered under a key, the sheet id for the sheets of this session and the save file path for
+    saved sheets. The puzzle ids of the saved sheets are persisted, so the puzzles on sheets of earlier sessions stay
+    used as long as their save files exist.
+
+    For sampling, the used puzzles are a bitmap over the rows of the puzzle table of the Lichess puzzle database,
+    which is updated whenever a puzzle becomes used or unused.
+    """
+    SESSION_KEY_PREFIX = 'session:'
+
+    def __init__(self, persistence_path: str | PathLike | None = None):
+        """
+        :param persistence_path: JSON file for the puzzle ids of the saved sheets, None to not persist them
+        """
+        self.log = logging.getLogger(__name__)
+        self.persistence_path = Path(persistence_path) if persistence_path is not None else None
+        self._puzzle_ids_by_key: dict[str, list[str]] = {}
+        # number of registered sheets per puzzle id, a puzzle is used while it is on at least one sheet
+        self._usage_counts: Counter[str] = Counter()
+        self._bitmap: numpy.ndarray | None = None
+        self._bitmap_store: PuzzleStore | None = None
+        # number of set rows of the bitmap, kept up to date with the bitmap
+        self._number_of_used_rows = 0
+        self._load()
+
+    def __len__(self) -> int:
+        return len(self._usage_counts)
+
+    def __contains__(self, puzzle_id: str) -> bool:
+        return puzzle_id in self._usage_counts
+
+    def update_session_sheet(self, sheet_id: str, sheet: PuzzleSheet) -> None:
+        self._update(self.SESSION_KEY_PREFIX + sheet_id, self.puzzle_ids_of(sheet))
+
+    def remove_session_sheet(self, sheet_id: str) -> None:
+        self._update(self.SESSION_KEY_PREFIX + sheet_id, [])
+
+    def update_saved_sheet(self, save_path: str | PathLike, puzzle_ids: Iterable[str]) -> None:
+        self.update_saved_sheets({save_path: puzzle_ids})
+
+    def update_saved_sheets(self, puzzle_ids_by_path: Mapping[str | PathLike, Iterable[str]]) -> None:
+        """Register the puzzles of several save files and persist them with one write."""
+        for save_path, puzzle_ids in puzzle_ids_by_path.items():
+            self._update(str(Path(save_path).resolve()), list(puzzle_ids))
+        self._save()
+
+    @staticmethod
+    def puzzle_ids_of(sheet: PuzzleSheet) -> list[str]:
+        return [element.puzzleId for element in sheet.elements if isinstance(element, LichessPuzzle)]
+
+    def get_bitmap(self, store: PuzzleStore) -> numpy.ndarray:
+        """
+        Bitmap over the rows of the puzzle table of the store, with the rows of the used puzzles set.
+        Built on first use for a puzzle table, afterwards only the rows of changed puzzles are updated.
+        """
+        base_store = store.get_base_store()
+        if self._bitmap_store is not base_store:
+            self._bitmap = numpy.zeros(len(base_store), dtype=bool)
+            self._bitmap_store = base_store
+            self._number_of_used_rows = 0
+            self._set_bits(list(self._usage_counts), True)
+        return self._bitmap
+
+    def count_used_rows(self) -> int:
+        """The number of set rows of the last bitmap of get_bitmap, without scanning the bitmap."""
+        return self._number_of_used_rows
+
+    def _update(self, key: str, puzzle_ids: list[str]) -> None:
+        old_puzzle_ids = self._puzzle_ids_by_key.pop(key, [])
+        if puzzle_ids:
+            self._puzzle_ids_by_key[key] = puzzle_ids
+        newly_used = [puzzle_id for puzzle_id in set(puzzle_ids) if self._usage_counts[puzzle_id] == 0]
+        self._usage_counts.update(set(puzzle_ids))
+        self._usage_counts.subtract(set(old_puzzle_ids))
+        no_longer_used = [puzzle_id for puzzle_id in set(old_puzzle_ids) if self._usage_counts[puzzle_id] <= 0]
+        for puzzle_id in no_longer_used:
+            del self._usage_counts[puzzle_id]
+        if self._bitmap is not None:
+            self._set_bits(newly_used, True)
+            self._set_bits(no_longer_used, False)
+
+    def _set_bits(self, puzzle_ids: list[str], value: bool) -> None:
+        if not puzzle_ids:
+            return
+        row_ids = self._bitmap_store.get_row_ids_of_puzzle_ids(puzzle_ids)
+        row_ids = row_ids[row_ids >= 0]
+        # newly used puzzles are not set yet and puzzles that are no longer used are set, so every row flips
+        self._bitmap[row_ids] = value
+        self._number_of_used_rows += len(row_ids) if value else -len(row_ids)
+
+    def _load(self) -> None:
+        if self.persistence_path is None or not self.persistence_path.is_file():
+            return
+        try:
+            with self.persistence_path.open('r') as persistence_file:
+                puzzle_ids_by_path = json.load(persistence_file)
+        except (OSError, ValueError) as error:
+            self.log.warning(f'Could not load the used puzzles from {self.persistence_path}.')
+            self.log.warning(error)
+            return
+        for save_path, puzzle_ids in puzzle_ids_by_path.items():
+            # puzzles of deleted save files are no longer used
+            if Path(save_path).is_file():
+                self._update(save_path, puzzle_ids)
+
+    def _save(self) -> None:
+        if self.persistence_path is None:
+            return
+        puzzle_ids_by_path = {
+            key: puzzle_ids for key, puzzle_ids in self._puzzle_ids_by_key.items()
+            if not key.startswith(self.SESSION_KEY_PREFIX)
+        }
+        try:
+            self.persistence_path.parent.mkdir(parents=True, exist_ok=True)
+            with self.persistence_path.open('w') as persistence_file:
+                json.dump(puzzle_ids_by_path, persistence_file)
+        except OSError as error:
+            self.log.warning(f'Could not save the used puzzles to {self.persistence_path}.')
+            self.log.warning(error)
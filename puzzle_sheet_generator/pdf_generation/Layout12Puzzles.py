@@ -1,6 +1,8 @@
+from reportlab.graphics.shapes import Drawing
 from reportlab.lib.units import cm
 from reportlab.pdfgen import canvas
 
+from puzzle_sheet_generator.pdf_generation.native_board import BoardDiagram
 from puzzle_sheet_generator.pdf_generation.PuzzleLayout import PageSettings, PuzzleLayout
 
 
@@ -13,7 +15,7 @@ class Layout12Puzzles(PuzzleLayout):
         self.vertical_skip = 1.2 * cm
         self.header_to_content_margin = 0.8 * cm
 
-    def place(self, svgs: list[tuple[str, bool]], page_canvas: canvas.Canvas) -> None:
+    def place(self, svgs: list[tuple[str | Drawing | BoardDiagram, bool]], page_canvas: canvas.Canvas) -> None:
         self.image_width = (self.page_settings.pagesize[0] - self.page_settings.margin_left_right() - 2 * self.horizontal_skip) / 3
         horizontal_image_spacing = self.image_width + self.horizontal_skip
         vertical_image_spacing = self.image_width + self.vertical_skip
@@ -1,6 +1,8 @@
+from reportlab.graphics.shapes import Drawing
 from reportlab.lib.units import cm
 from reportlab.pdfgen import canvas
 
+from puzzle_sheet_generator.pdf_generation.native_board import BoardDiagram
 from puzzle_sheet_generator.pdf_generation.PuzzleLayout import PageSettings, PuzzleLayout
 
 
@@ -15,7 +17,7 @@ class Layout6Puzzles(PuzzleLayout):
         self.header_to_content_margin = 0.8 * cm
         self.content_to_footer_margin = 0.5 * cm
 
-    def place(self, svgs: list[tuple[str, bool]], page_canvas: canvas.Canvas) -> None:
+    def place(self, svgs: list[tuple[str | Drawing | BoardDiagram, bool]], page_canvas: canvas.Canvas) -> None:
         self.image_width = (self.page_settings.pagesize[1]
                             - self.page_settings.margin_header_footer()
                             - self.header_to_content_margin
@@ -10,6 +10,8 @@ from reportlab.lib.units import cm
 from reportlab.pdfgen import canvas
 from svglib import svglib
 
+from puzzle_sheet_generator.pdf_generation.native_board import BoardDiagram
+
 HeaderFooterText = namedtuple('HeaderFooterText', ('left_header', 'right_header', 'footer'))
 
 class PageSettings:
@@ -40,17 +42,31 @@ class PuzzleLayout(ABC):
         self.image_width = None
 
     @abstractmethod
-    def place(self, svgs: list[tuple[str, bool]], page_canvas: canvas.Canvas) -> None:
+    def place(self, svgs: list[tuple[str | Drawing | BoardDiagram, bool]], page_canvas: canvas.Canvas) -> None:
+        """
+        :param svgs: list of tuples with SVG, already rendered drawing or native board diagram and side to move
+        :param page_canvas: canvas of the page
+        """
         pass
 
-    def _place_puzzle(self, svg: str, turn: bool, x: float, y: float, page_canvas: canvas.Canvas) -> None:
-        drawing = svg_to_rgl(svg)
-        scaling_x = self.image_width / drawing.width
-        scaling_y = self.image_width / drawing.height
-        drawing.width = self.image_width
-        drawing.height = self.image_width
-        drawing.scale(scaling_x, scaling_y)
-        renderPDF.draw(drawing, page_canvas, x, y - self.image_width)
+    def _place_puzzle(
+            self,
+            svg: str | Drawing | BoardDiagram,
+            turn: bool,
+            x: float,
+            y: float,
+            page_canvas: canvas.Canvas
+    ) -> None:
+        if isinstance(svg, BoardDiagram):
+            svg.draw(page_canvas, x, y - self.image_width, self.image_width)
+        else:
+            drawing = svg_to_rgl(svg) if isinstance(svg, str) else svg
+            # scale the canvas instead of the drawing, cached drawings are placed on many pages
+            page_canvas.saveState()
+            page_canvas.translate(x, y - self.image_width)
+            page_canvas.scale(self.image_width / drawing.width, self.image_width / drawing.height)
+            renderPDF.draw(drawing, page_canvas, 0, 0)
+            page_canvas.restoreState()
         page_canvas.circle(
             x + self.image_width + self.move_circle_radius + 0.12 * cm,
             y - 0.1 * self.image_width,
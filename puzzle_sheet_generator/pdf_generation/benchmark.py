@@ -0,0 +1,318 @@
+"""
+Benchmark of the stages of printing puzzle sheets, from creating the SVGs of the boards to writing the PDF.
+
+Run the benchmark and save the result as JSON:
+    python -m puzzle_sheet_generator.pdf_generation.benchmark run -o result.json
+Compare the result of a change with the result before, the exit status is 1 if a stage got slower than the threshold:
+    python -m puzzle_sheet_generator.pdf_generation.benchmark compare before.json result.json
+"""
+import io
+import json
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from argparse import ArgumentParser, Namespace
+from collections.abc import Callable
+from pathlib import Path
+
+import chess
+import reportlab
+import svglib
+from reportlab.pdfgen import canvas
+
+from puzzle_sheet_generator.model.sheet_element import svg_from_board
+from puzzle_sheet_generator.pdf_generation.generate_pdf import make_pdf_puzzle_page
+from puzzle_sheet_generator.pdf_generation.Layout6Puzzles import Layout6Puzzles
+from puzzle_sheet_generator.pdf_generation.Layout12Puzzles import Layout12Puzzles
+from puzzle_sheet_generator.pdf_generation.native_board import BoardDiagram
+from puzzle_sheet_generator.pdf_generation.PuzzleLayout import HeaderFooterText, PageSettings, PuzzleLayout, svg_to_rgl
+from puzzle_sheet_generator.pdf_generation.svg_render_context import SvgRenderContext
+
+__all__ = ('CORPUS', 'STAGES', 'compare_results', 'run_benchmark')
+
+RESULT_FORMAT_VERSION = 1
+DEFAULT_ROUNDS = 3
+DEFAULT_THRESHOLD = 0.1
+
+# fixed positions from openings, middlegames and endgames with both sides to move, so the results of runs compare
+CORPUS = (
+    'r1bqkbnr/pppp1ppp/2n5/4p3/4P3/5N2/PPPP1PPP/RNBQKB1R w KQkq - 2 3',
+    'rnbqkb1r/pp2pppp/3p1n2/8/3NP3/8/PPP2PPP/RNBQKB1R w KQkq - 1 5',
+    'r1bqk2r/pppp1ppp/2n2n2/2b1p3/2B1P3/3P1N2/PPP2PPP/RNBQK2R b KQkq - 0 5',
+    'rnbqkb1r/ppp2ppp/4pn2/3p2B1/2PP4/2N5/PP2PPPP/R2QKBNR b KQkq - 3 4',
+    'r1bq1rk1/ppp2ppp/2np1n2/2b1p3/2B1P3/2NP1N2/PPP2PPP/R1BQ1RK1 w - - 4 7',
+    'r2qr1k1/pp1nbppp/2p2n2/3p4/3P1B2/2NBP3/PPQ2PPP/R4RK1 b - - 5 12',
+    'r1b2rk1/2q1bppp/p2ppn2/1p6/3NPP2/P1N1B3/1PP1B1PP/R2Q1RK1 w - - 0 13',
+    '2rq1rk1/pb2bppp/1pn1pn2/2pp4/3P4/1PNBPN2/PB3PPP/2RQ1RK1 w - - 2 12',
+    'r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10',
+    '3r1rk1/p4ppp/1qp1b3/4P3/1p2Q3/1B6/PPP3PP/R4R1K b - - 0 19',
+    'r5k1/pp3ppp/2p5/3pr3/3P4/2P3P1/PP3P1P/R3R1K1 w - - 0 21',
+    '6k1/5ppp/8/8/8/8/5PPP/3R2K1 w - - 0 1',
+    '8/8/4k3/8/2p5/2P5/2K5/8 w - - 0 1',
+    '8/5pk1/6p1/7p/7P/6P1/r4PK1/1R6 b - - 3 41',
+    '8/8/8/4k3/8/8/4P3/4K3 w - - 0 1',
+    '2k5/8/1K6/8/8/8/8/7Q w - - 0 1',
+    '5rk1/pp4pp/2p5/2b1P3/4Pq2/1PNp4/P2Q2PP/R4R1K b - - 1 24',
+    'r1bqr1k1/pp3ppp/2pb1n2/3p4/3P4/2PB1N2/PP1N1PPP/R2QR1K1 b - - 5 11',
+    '4r1k1/1p3ppp/p1p5/2b5/4P3/1P3N1P/P4PP1/3R2K1 w - - 0 25',
+    'r3k2r/ppp1qppp/2n1bn2/3pp3/1b1PP3/2NBBN2/PPPQ1PPP/R3K2R w KQkq - 6 9',
+    '1k1r3r/ppp2ppp/2n5/2b1p3/4P1q1/2NP1N2/PPPQ1PPP/R3KB1R w KQ - 3 11',
+    '8/p4k2/1p3p2/2p1p2p/2P1P1pP/1P1K2P1/P7/8 b - - 1 38',
+    '3q1rk1/5ppp/p2p4/1p1Pp3/4P1n1/1BN3Pb/PP3P1P/R2Q1RK1 w - - 0 18',
+    'r1b1k2r/ppppnppp/2n2q2/2b5/3NP3/2P1B3/PP3PPP/RN1QKB1R w KQkq - 1 7',
+)
+
+DIAGRAM_RENDERERS = ('svg', 'native')
+
+
+class BenchmarkInput:
+    """The boards of the corpus in the form every stage takes, prepared before any stage is timed."""
+
+    def __init__(self, fens: tuple[str, ...], diagram_renderer: str, diagram_board_colors: dict[str, str]):
+        self.diagram_board_colors = diagram_board_colors
+        self.boards = [chess.Board(fen) for fen in fens]
+        self.svgs = [(svg_from_board(board, diagram_board_colors), board.turn) for board in self.boards]
+        svg_render_context = SvgRenderContext()
+        self.diagrams = [(BoardDiagram(board.fen(), board.turn, diagram_board_colors), board.turn)
+                         for board in self.boards] \
+            if diagram_renderer == 'native' \
+            else [(svg_render_context.render(svg), turn) for svg, turn in self.svgs]
+
+    def __len__(self) -> int:
+        return len(self.boards)
+
+
+def _stage_svg_from_board(benchmark_input: BenchmarkInput) -> None:
+    for board in benchmark_input.boards:
+        svg_from_board(board, benchmark_input.diagram_board_colors)
+
+
+def _stage_svg_to_rgl(benchmark_input: BenchmarkInput) -> None:
+    for svg, _ in benchmark_input.svgs:
+        svg_to_rgl(svg)
+
+
+def _stage_svg_render_context(benchmark_input: BenchmarkInput) -> None:
+    # a new context per round, like every print job
+    svg_render_context = SvgRenderContext()
+    for svg, _ in benchmark_input.svgs:
+        svg_render_context.render(svg)
+
+
+def _stage_place_puzzle(benchmark_input: BenchmarkInput) -> int:
+    pdf_buffer = io.BytesIO()
+    page_canvas = canvas.Canvas(pdf_buffer, pageCompression=1)
+    layout = Layout12Puzzles(PageSettings())
+    # placing no puzzles only sets the image width of the layout
+    layout.place([], page_canvas)
+    for index, (diagram, turn) in enumerate(benchmark_input.diagrams):
+        layout._place_puzzle(diagram, turn, layout.page_settings.margin_left, layout.image_width, page_canvas)
+        if index % Layout12Puzzles.MAXIMUM_PUZZLES_IN_LAYOUT == Layout12Puzzles.MAXIMUM_PUZZLES_IN_LAYOUT - 1:
+            page_canvas.showPage()
+    page_canvas.save()
+    return len(pdf_buffer.getvalue())
+
+
+def _place_pages(benchmark_input: BenchmarkInput, layout: PuzzleLayout) -> int:
+    pdf_buffer = io.BytesIO()
+    page_canvas = canvas.Canvas(pdf_buffer, pageCompression=1)
+    for page_diagrams in _pages(benchmark_input.diagrams, layout.MAXIMUM_PUZZLES_IN_LAYOUT):
+        layout.place(page_diagrams, page_canvas)
+        page_canvas.showPage()
+    page_canvas.save()
+    return len(pdf_buffer.getvalue())
+
+
+def _stage_layout6_place(benchmark_input: BenchmarkInput) -> int:
+    return _place_pages(benchmark_input, Layout6Puzzles(PageSettings()))
+
+
+def _stage_layout12_place(benchmark_input: BenchmarkInput) -> int:
+    return _place_pages(benchmark_input, Layout12Puzzles(PageSettings()))
+
+
+def _stage_make_pdf_puzzle_page(benchmark_input: BenchmarkInput) -> int:
+    """Print the SVGs from scratch, a PDF file per page of 12 boards."""
+    pdf_bytes = 0
+    with tempfile.TemporaryDirectory() as temporary_dir:
+        for index, page_svgs in enumerate(_pages(benchmark_input.svgs, Layout12Puzzles.MAXIMUM_PUZZLES_IN_LAYOUT)):
+            pdf_path = Path(temporary_dir) / f'page-{index}.pdf'
+            make_pdf_puzzle_page(pdf_path, page_svgs, HeaderFooterText('Benchmark', '', ''))
+            pdf_bytes += pdf_path.stat().st_size
+    return pdf_bytes
+
+
+def _pages(diagrams: list, puzzles_per_page: int) -> list[list]:
+    return [diagrams[start:start + puzzles_per_page] for start in range(0, len(diagrams), puzzles_per_page)]
+
+
+# the stages return the size of the PDF they write or None
+STAGES: dict[str, Callable[[BenchmarkInput], int | None]] = {
+    'svg_from_board': _stage_svg_from_board,
+    'svg_to_rgl': _stage_svg_to_rgl,
+    'svg_render_context': _stage_svg_render_context,
+    'place_puzzle': _stage_place_puzzle,
+    'layout6_place': _stage_layout6_place,
+    'layout12_place': _stage_layout12_place,
+    'make_pdf_puzzle_page': _stage_make_pdf_puzzle_page,
+}
+
+
+def run_stage(stage: Callable[[BenchmarkInput], int | None], benchmark_input: BenchmarkInput, rounds: int) -> dict:
+    """
+    Time the stage over the given number of rounds and measure its peak memory in one more round.
+    The fastest round is reported, it is the least disturbed by other processes.
+    """
+    round_seconds = []
+    pdf_bytes = None
+    for _ in range(rounds):
+        start_time = time.perf_counter()
+        pdf_bytes = stage(benchmark_input)
+        round_seconds.append(time.perf_counter() - start_time)
+    # tracing the allocations slows the stage down, so the memory is measured in a round that is not timed
+    tracemalloc.start()
+    stage(benchmark_input)
+    peak_memory = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    seconds = min(round_seconds)
+    return {
+        'boards': len(benchmark_input),
+        'seconds': seconds,
+        'mean_seconds': sum(round_seconds) / len(round_seconds),
+        'ms_per_board': 1000 * seconds / len(benchmark_input),
+        'boards_per_second': len(benchmark_input) / seconds if seconds > 0 else None,
+        'peak_memory_bytes': peak_memory,
+        'pdf_bytes': pdf_bytes,
+    }
+
+
+def run_benchmark(
+        stages: list[str] | None = None,
+        rounds: int = DEFAULT_ROUNDS,
+        diagram_renderer: str = 'svg',
+        diagram_board_colors: dict[str, str] | None = None,
+        fens: tuple[str, ...] = CORPUS
+) -> dict:
+    """
+    :param stages: names of the STAGES to run, None for all
+    :param rounds: number of timed rounds of every stage
+    :param diagram_renderer: 'svg' to place converted drawings or 'native' to place native board diagrams
+    :param diagram_board_colors: colors of the diagrams as in the diagram board colors configuration
+    :param fens: the positions of the boards
+    :return: the result as dictionary, that can be saved as JSON
+    """
+    if rounds <= 0:
+        raise Exception('The number of rounds has to be positive.')
+    for stage in stages or ():
+        if stage not in STAGES:
+            raise Exception(f'Unknown stage {stage}, expected one of {", ".join(STAGES)}.')
+    if diagram_renderer not in DIAGRAM_RENDERERS:
+        raise Exception(f'Unknown diagram renderer {diagram_renderer}, '
+                        f'expected one of {", ".join(DIAGRAM_RENDERERS)}.')
+    benchmark_input = BenchmarkInput(fens, diagram_renderer,
+                                     diagram_board_colors if diagram_board_colors is not None else {})
+    return {
+        'format_version': RESULT_FORMAT_VERSION,
+        'python': platform.python_version(),
+        'libraries': {'chess': chess.__version__, 'svglib': svglib.__version__, 'reportlab': reportlab.Version},
+        'diagram_renderer': diagram_renderer,
+        'boards': len(benchmark_input),
+        'rounds': rounds,
+        'stages': {name: run_stage(STAGES[name], benchmark_input, rounds) for name in stages or STAGES},
+    }
+
+
+def compare_results(baseline: dict, candidate: dict, threshold: float = DEFAULT_THRESHOLD) -> dict:
+    """
+    Compare the stages that ran in both results.
+    :param baseline: result of the run before the change
+    :param candidate: result of the run with the change
+    :param threshold: relative increase of the time per board, at which a stage counts as regression
+    :return: the changes per stage and the names of the stages with regressions
+    """
+    stages = {}
+    for name, baseline_stage in baseline['stages'].items():
+        candidate_stage = candidate['stages'].get(name)
+        if candidate_stage is None:
+            continue
+        change = candidate_stage['ms_per_board'] / baseline_stage['ms_per_board'] - 1 \
+            if baseline_stage['ms_per_board'] > 0 \
+            else 0.0
+        stages[name] = {
+            'baseline_ms_per_board': baseline_stage['ms_per_board'],
+            'candidate_ms_per_board': candidate_stage['ms_per_board'],
+            'change': change,
+            'baseline_peak_memory_bytes': baseline_stage['peak_memory_bytes'],
+            'candidate_peak_memory_bytes': candidate_stage['peak_memory_bytes'],
+            'baseline_pdf_bytes': baseline_stage['pdf_bytes'],
+            'candidate_pdf_bytes': candidate_stage['pdf_bytes'],
+            'regression': change > threshold,
+        }
+    warnings = [f'The {key} differs between the runs, the results are not comparable.'
+                for key in ('libraries', 'diagram_renderer', 'boards')
+                if baseline.get(key) != candidate.get(key)]
+    return {
+        'threshold': threshold,
+        'stages': stages,
+        'regressions': [name for name, stage in stages.items() if stage['regression']],
+        'warnings': warnings,
+    }
+
+
+def _format_comparison(comparison: dict) -> str:
+    lines = [f'{"stage":<22}{"ms/board before":>16}{"ms/board after":>16}{"change":>9}  '
+             f'{"peak memory":>20}  {"PDF size":>20}']
+    for name, stage in comparison['stages'].items():
+        memory = f'{stage["baseline_peak_memory_bytes"] // 1024} -> {stage["candidate_peak_memory_bytes"] // 1024} KiB'
+        pdf_size = f'{stage["baseline_pdf_bytes"] // 1024} -> {stage["candidate_pdf_bytes"] // 1024} KiB' \
+            if stage['baseline_pdf_bytes'] is not None and stage['candidate_pdf_bytes'] is not None \
+            else ''
+        lines.append(f'{name:<22}{stage["baseline_ms_per_board"]:>16.3f}{stage["candidate_ms_per_board"]:>16.3f}'
+                     f'{stage["change"]:>+9.1%}  {memory:>20}  {pdf_size:>20}'
+                     f'{"  REGRESSION" if stage["regression"] else ""}')
+    lines += comparison['warnings']
+    return '\n'.join(lines)
+
+
+def get_parser() -> ArgumentParser:
+    parser = ArgumentParser(description='Benchmark the stages of printing puzzle sheets')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    run_parser = subparsers.add_parser('run', help='Run the benchmark and print or save the result as JSON')
+    run_parser.add_argument('-o', '--out-file', help='Filepath to save the result to, printed if not given')
+    run_parser.add_argument('-r', '--rounds', type=int, default=DEFAULT_ROUNDS,
+                            help='Number of timed rounds per stage, the fastest round is reported')
+    run_parser.add_argument('-s', '--stages', nargs='+', choices=tuple(STAGES), help='Only run these stages')
+    run_parser.add_argument('-d', '--diagram-renderer', choices=DIAGRAM_RENDERERS, default='svg',
+                            help='Place converted drawings or native board diagrams in the placing stages')
+    run_parser.add_argument('-c', '--colors', help='Filepath of diagram board colors to render the boards with')
+    compare_parser = subparsers.add_parser('compare', help='Compare two results, exit status 1 on regressions')
+    compare_parser.add_argument('baseline', help='Result before the change')
+    compare_parser.add_argument('candidate', help='Result with the change')
+    compare_parser.add_argument('-t', '--threshold', type=float, default=DEFAULT_THRESHOLD,
+                                help='Relative increase of the time per board, that counts as regression')
+    compare_parser.add_argument('--json', action='store_true', help='Print the comparison as JSON')
+    return parser
+
+
+def main(argv: list[str] | None = None) -> int:
+    parsed_args: Namespace = get_parser().parse_args(argv)
+    if parsed_args.command == 'run':
+        diagram_board_colors = json.loads(Path(parsed_args.colors).read_text()) if parsed_args.colors else None
+        result = json.dumps(run_benchmark(parsed_args.stages, parsed_args.rounds, parsed_args.diagram_renderer,
+                                          diagram_board_colors), indent=2)
+        if parsed_args.out_file:
+            Path(parsed_args.out_file).write_text(result)
+        else:
+            print(result)
+        return 0
+    comparison = compare_results(json.loads(Path(parsed_args.baseline).read_text()),
+                                 json.loads(Path(parsed_args.candidate).read_text()),
+                                 parsed_args.threshold)
+    print(json.dumps(comparison, indent=2) if parsed_args.json else _format_comparison(comparison))
+    return 1 if comparison['regressions'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,164 @@
+import functools
+import logging
+import multiprocessing
+import os
+from collections import deque
+from collections.abc import Iterable, Iterator
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+
+import chess
+from reportlab.graphics.shapes import Drawing
+
+from puzzle_sheet_generator.model.app_config import AppConfig
+from puzzle_sheet_generator.model.puzzle_sheet import PuzzleSheet
+from puzzle_sheet_generator.model.sheet_element import SheetElement, svg_from_board
+from puzzle_sheet_generator.pdf_generation.diagram_cache import RenderedDiagramCache
+from puzzle_sheet_generator.pdf_generation.native_board import BoardDiagram
+from puzzle_sheet_generator.pdf_generation.svg_render_context import SvgRenderContext
+
+DrawingWithSideToMove = tuple[Drawing, bool]
+DiagramWithSideToMove = tuple[Drawing | BoardDiagram, bool]
+
+
+@functools.cache
+def _get_worker_svg_render_context() -> SvgRenderContext:
+    """The render context of a worker process, the context of a print job is too large to send with every board."""
+    return SvgRenderContext()
+
+
+def render_board(
+        fen: str,
+        diagram_board_colors: dict[str, str] | None,
+        svg_render_context: SvgRenderContext | None = None
+) -> Drawing:
+    """
+    Create the SVG of a board and transform it to a ReportLab Graphics Drawing object.
+    Runs in the worker processes, so it only takes arguments that are cheap to send to them.
+    :param fen: FEN of the position
+    :param diagram_board_colors: colors of the diagram as in the diagram board colors configuration
+    :param svg_render_context: context of the print job, None to use the context of the worker process
+    """
+    if svg_render_context is None:
+        svg_render_context = _get_worker_svg_render_context()
+    return svg_render_context.render(svg_from_board(chess.Board(fen), diagram_board_colors))
+
+
+class BoardRenderer:
+    """
+    Renders the boards of sheet elements to ReportLab drawings on a pool of worker processes or threads.
+    Only the rendering runs in parallel, the drawings are returned in the order of the elements, so they can be placed
+    on the canvas sequentially. The pool is started on the first render and reused for all later print jobs.
+    Boards that are in the diagram cache are not rendered again. The SVGs of a print job are converted with one render
+    context, so the pieces and the empty boards are only converted once.
+
+    With the native diagram renderer the boards are not rendered ahead, but drawn with canvas primitives when they are
+    placed, which is cheaper than sending them to workers.
+    """
+    POOL_TYPES = AppConfig.RENDER_POOL_TYPES
+    DIAGRAM_RENDERERS = AppConfig.DIAGRAM_RENDERERS
+    # boards that are submitted ahead of the page that is drawn, per worker, to keep all workers busy
+    BOARDS_IN_FLIGHT_PER_WORKER = 2
+
+    def __init__(
+            self,
+            workers: int = 1,
+            pool_type: str = 'process',
+            diagram_renderer: str = 'svg',
+            diagram_cache: RenderedDiagramCache | None = None
+    ):
+        """
+        :param workers: number of workers, 0 for one worker per CPU, 1 to render on the calling thread
+        :param pool_type: one of POOL_TYPES, threads only help if the rendering releases the GIL
+        :param diagram_renderer: one of DIAGRAM_RENDERERS, 'svg' to convert the SVGs of chess.svg with svglib
+            or 'native' to draw the boards directly on the canvas
+        :param diagram_cache: cache of the rendered drawings, None to render every board
+        """
+        if pool_type not in self.POOL_TYPES:
+            raise Exception(f'Unknown pool type {pool_type}, expected one of {", ".join(self.POOL_TYPES)}.')
+        if diagram_renderer not in self.DIAGRAM_RENDERERS:
+            raise Exception(f'Unknown diagram renderer {diagram_renderer}, '
+                            f'expected one of {", ".join(self.DIAGRAM_RENDERERS)}.')
+        self.log = logging.getLogger(__name__)
+        self.workers = workers if workers > 0 else os.cpu_count() or 1
+        self.pool_type = pool_type
+        self.diagram_renderer = diagram_renderer
+        self.diagram_cache = diagram_cache
+        self._executor: Executor | None = None
+
+    def render(self, elements: list[SheetElement], diagram_board_colors: dict[str, str] | None
+               ) -> list[DiagramWithSideToMove]:
+        """Render the boards of the elements of one sheet."""
+        return next(self.render_sheets([elements], diagram_board_colors))
+
+    def render_sheets(self, sheets: Iterable[PuzzleSheet | list[SheetElement]],
+                      diagram_board_colors: dict[str, str] | None) -> Iterator[list[DiagramWithSideToMove]]:
+        """
+        Render the boards of the sheets and yield the drawings sheet by sheet.
+        The boards of the following sheets are already rendered while a sheet is placed on its page, but only as many
+        as keep the workers busy, so the memory does not grow with the number of sheets.
+        """
+        if self.diagram_renderer == 'native':
+            for sheet in sheets:
+                elements = sheet.elements if isinstance(sheet, PuzzleSheet) else sheet
+                yield [(BoardDiagram(element.get_fen(), element.get_side_to_move(), diagram_board_colors),
+                        element.get_side_to_move())
+                       for element in elements]
+            return
+        executor = self._get_executor() if self.workers > 1 else None
+        # threads share the context of the print job, worker processes keep their own
+        svg_render_context = SvgRenderContext() if executor is None or self.pool_type == 'thread' else None
+        pending: deque[list[tuple[str, Drawing | Future, bool]]] = deque()
+        boards_in_flight = 0
+        for sheet in sheets:
+            elements = sheet.elements if isinstance(sheet, PuzzleSheet) else sheet
+            pending.append([self._submit(executor, svg_render_context, element, diagram_board_colors)
+                            for element in elements])
+            boards_in_flight += len(elements)
+            while pending and (executor is None
+                               or boards_in_flight >= self.BOARDS_IN_FLIGHT_PER_WORKER * self.workers):
+                boards_in_flight -= len(pending[0])
+                yield self._results(pending.popleft())
+        while pending:
+            yield self._results(pending.popleft())
+
+    def _submit(
+            self,
+            executor: Executor | None,
+            svg_render_context: SvgRenderContext | None,
+            element: SheetElement,
+            diagram_board_colors: dict[str, str] | None
+    ) -> tuple[str, Drawing | Future, bool]:
+        """The cached drawing of the board of the element or the future of its rendering."""
+        fen = element.get_fen()
+        side_to_move = element.get_side_to_move()
+        key = RenderedDiagramCache.key(fen, side_to_move, diagram_board_colors)
+        drawing = self.diagram_cache.get(key) if self.diagram_cache is not None else None
+        if drawing is not None:
+            return key, drawing, side_to_move
+        if executor is None:
+            return key, self._remember(key, render_board(fen, diagram_board_colors, svg_render_context)), side_to_move
+        return key, executor.submit(render_board, fen, diagram_board_colors, svg_render_context), side_to_move
+
+    def _results(self, rendered: list[tuple[str, Drawing | Future, bool]]) -> list[DrawingWithSideToMove]:
+        return [(self._remember(key, drawing.result()) if isinstance(drawing, Future) else drawing, side_to_move)
+                for key, drawing, side_to_move in rendered]
+
+    def _remember(self, key: str, drawing: Drawing) -> Drawing:
+        if self.diagram_cache is not None:
+            self.diagram_cache.put(key, drawing)
+        return drawing
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            self.log.debug(f'Starting a {self.pool_type} pool with {self.workers} workers for rendering boards.')
+            if self.pool_type == 'process':
+                # spawned workers do not inherit the locks of the thread that loads the puzzle database
+                self._executor = ProcessPoolExecutor(self.workers, multiprocessing.get_context('spawn'))
+            else:
+                self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix='board-renderer')
+        return self._executor
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
@@ -0,0 +1,161 @@
+import hashlib
+import logging
+import pickle
+import shutil
+import tempfile
+import zlib
+from collections import OrderedDict
+from os import PathLike
+from pathlib import Path
+
+import chess
+import reportlab
+import svglib
+from reportlab.graphics.shapes import Drawing
+
+from puzzle_sheet_generator.pdf_generation.native_board import colors_key
+
+
+class RenderedDiagramCache:
+    """
+    Least recently used cache of the drawings of rendered diagrams, so printing the same boards again skips creating
+    and converting their SVGs. The key is the board part of the FEN together with the orientation and a hash of the
+    diagram board colors. The drawings can also be stored on disk, in a directory per version of the rendering
+    libraries, so they are reused in later sessions.
+
+    The cached drawings are shared by all pages they are placed on, so they must never be changed.
+    """
+    DRAWING_FILE_TYPE = '.drawing'
+    # a drawing takes about 500 KiB in memory and about 13 KiB compressed on disk
+    DEFAULT_MAX_ENTRIES = 128
+    DEFAULT_MAX_DISK_ENTRIES = 4096
+
+    def __init__(
+            self,
+            max_entries: int = DEFAULT_MAX_ENTRIES,
+            cache_dir: str | PathLike | None = None,
+            max_disk_entries: int = DEFAULT_MAX_DISK_ENTRIES
+    ):
+        """
+        :param max_entries: number of drawings kept in memory
+        :param cache_dir: directory for the drawings on disk, None to only keep the drawings in memory
+        :param max_disk_entries: number of drawings kept on disk for the current library versions
+        """
+        self.log = logging.getLogger(__name__)
+        self.max_entries = max_entries
+        self.cache_dir = Path(cache_dir) if cache_dir is not None else None
+        self.max_disk_entries = max_disk_entries
+        self._drawings: OrderedDict[str, Drawing] = OrderedDict()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._drawings)
+
+    @staticmethod
+    def key(fen: str, orientation: bool, diagram_board_colors: dict[str, str] | None) -> str:
+        """
+        :param fen: FEN of the position, only the board part is part of the key
+        :param orientation: the side at the bottom of the board
+        :param diagram_board_colors: colors of the diagram as in the diagram board colors configuration
+        """
+        colors = colors_key(diagram_board_colors if diagram_board_colors is not None else {})
+        return f'{fen.split(" ", maxsplit=1)[0]} {"w" if orientation == chess.WHITE else "b"} {colors}'
+
+    def set_cache_dir(self, cache_dir: str | PathLike | None) -> None:
+        """
+        Start or stop storing the drawings on disk, the drawings in memory and the counters are kept.
+        :param cache_dir: directory for the drawings on disk, None to only keep the drawings in memory
+        """
+        self.cache_dir = Path(cache_dir) if cache_dir is not None else None
+
+    def get_hit_rate(self) -> float | None:
+        lookups = self.hits + self.disk_hits + self.misses
+        return (self.hits + self.disk_hits) / lookups if lookups > 0 else None
+
+    def get(self, key: str) -> Drawing | None:
+        drawing = self._drawings.get(key)
+        if drawing is not None:
+            self._drawings.move_to_end(key)
+            self.hits += 1
+            return drawing
+        drawing = self._load(key)
+        if drawing is not None:
+            self._remember(key, drawing)
+            self.disk_hits += 1
+            return drawing
+        self.misses += 1
+        return None
+
+    def put(self, key: str, drawing: Drawing) -> None:
+        self._remember(key, drawing)
+        self._store(key, drawing)
+
+    def clear(self) -> None:
+        """Remove all drawings from memory and disk and reset the counters."""
+        self._drawings.clear()
+        self.hits = self.disk_hits = self.misses = 0
+        if self.cache_dir is not None:
+            shutil.rmtree(self.cache_dir, ignore_errors=True)
+
+    def _remember(self, key: str, drawing: Drawing) -> None:
+        self._drawings[key] = drawing
+        self._drawings.move_to_end(key)
+        while len(self._drawings) > self.max_entries:
+            self._drawings.popitem(last=False)
+
+    @staticmethod
+    def _library_version() -> str:
+        """Pickled drawings can only be read with the versions of the libraries that rendered them."""
+        return f'chess-{chess.__version__}-svglib-{svglib.__version__}-reportlab-{reportlab.Version}'
+
+    def _drawing_path(self, key: str) -> Path:
+        return self.cache_dir / self._library_version() \
+            / (hashlib.sha256(key.encode()).hexdigest() + self.DRAWING_FILE_TYPE)
+
+    def _load(self, key: str) -> Drawing | None:
+        if self.cache_dir is None:
+            return None
+        drawing_path = self._drawing_path(key)
+        if not drawing_path.is_file():
+            return None
+        try:
+            # the cache directory belongs to the user, it only contains drawings that this app pickled
+            drawing = pickle.loads(zlib.decompress(drawing_path.read_bytes()))
+            # the modification time orders the drawings on disk from least to most recently used
+            drawing_path.touch()
+            return drawing
+        except (OSError, zlib.error, pickle.UnpicklingError, AttributeError, EOFError) as error:
+            self.log.warning(f'Could not load the cached diagram {drawing_path}.')
+            self.log.warning(error)
+            return None
+
+    def _store(self, key: str, drawing: Drawing) -> None:
+        if self.cache_dir is None:
+            return
+        drawing_path = self._drawing_path(key)
+        try:
+            self._remove_other_versions()
+            drawing_path.parent.mkdir(parents=True, exist_ok=True)
+            # write to a temporary file first, so other processes never read a partial drawing
+            with tempfile.NamedTemporaryFile(dir=drawing_path.parent, suffix='.tmp', delete=False) as temporary_file:
+                temporary_file.write(zlib.compress(pickle.dumps(drawing, protocol=pickle.HIGHEST_PROTOCOL)))
+            Path(temporary_file.name).replace(drawing_path)
+            self._evict_disk_entries(drawing_path.parent)
+        except OSError as error:
+            self.log.warning(f'Could not save the diagram to {drawing_path}.')
+            self.log.warning(error)
+
+    def _remove_other_versions(self) -> None:
+        """Drawings of other library versions are never read again."""
+        if not self.cache_dir.is_dir():
+            return
+        for version_dir in self.cache_dir.iterdir():
+            if version_dir.is_dir() and version_dir.name != self._library_version():
+                shutil.rmtree(version_dir, ignore_errors=True)
+
+    def _evict_disk_entries(self, version_dir: Path) -> None:
+        drawing_paths = sorted(version_dir.glob('*' + self.DRAWING_FILE_TYPE), key=lambda path: path.stat().st_mtime)
+        for drawing_path in drawing_paths[:max(0, len(drawing_paths) - self.max_disk_entries)]:
+            drawing_path.unlink(missing_ok=True)
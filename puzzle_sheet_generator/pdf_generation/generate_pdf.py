@@ -1,14 +1,125 @@
+from collections.abc import Iterable
 from pathlib import Path
 
+from reportlab.graphics.shapes import Drawing
 from reportlab.lib import pagesizes
 from reportlab.lib.units import cm
 from reportlab.pdfgen import canvas
 
+from puzzle_sheet_generator.model.app_config import AppConfig
+from puzzle_sheet_generator.model.puzzle_sheet import PuzzleSheet
+from puzzle_sheet_generator.pdf_generation.board_renderer import BoardRenderer
 from puzzle_sheet_generator.pdf_generation.Layout6Puzzles import Layout6Puzzles
 from puzzle_sheet_generator.pdf_generation.Layout12Puzzles import Layout12Puzzles
 from puzzle_sheet_generator.pdf_generation.PuzzleLayout import HeaderFooterText, PageSettings, PuzzleLayout
+from puzzle_sheet_generator.pdf_generation.svg_render_context import SvgRenderContext
+
+__all__ = ('PuzzleSheetDocument', 'create_layout', 'make_pdf_puzzle_page', 'make_pdf_puzzle_pages')
+
+
+class PuzzleSheetDocument:
+    """
+    A PDF document, that puzzle sheets are streamed into as pages of one canvas.
+    Every page is finished with showPage before the next page is drawn, so only the drawings of the current page and
+    of the boards the board renderer renders ahead are held in memory and the content stream of a finished page is
+    compressed right away. Resources that are used on many pages, like the fonts, are written to the document once.
+    """
+
+    def __init__(
+            self,
+            outfile: str | Path,
+            layout: PuzzleLayout | None = None,
+            app_config: AppConfig | None = None,
+            board_renderer: BoardRenderer | None = None
+    ):
+        """
+        :param outfile: path to output
+        :param layout: a layout for the puzzles on all pages, None to choose a layout per page
+        :param app_config: configuration with the diagram board colors, only needed to add sheets
+        :param board_renderer: renderer for the boards of added sheets, None to render them on the calling thread
+        """
+        self.outfile = outfile
+        self.layout = layout
+        self.app_config = app_config
+        self.board_renderer = board_renderer if board_renderer is not None else BoardRenderer()
+        self.number_of_pages = 0
+        # converts the SVGs of added pages, sharing the pieces and backgrounds between all boards of the document
+        self.svg_render_context = SvgRenderContext()
+        self.page_canvas = canvas.Canvas(
+            str(outfile),
+            pagesize=pagesizes.A4,
+            pageCompression=1,
+        )
+        self._page_settings = PageSettings()
+        self._automatic_layouts: dict[type[PuzzleLayout], PuzzleLayout] = {}
+        if type(layout) is Layout6Puzzles:
+            self._page_settings.margin_left = 2 * cm
+            self._page_settings.margin_right = 2 * cm
+
+    def __enter__(self) -> 'PuzzleSheetDocument':
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        # a failed document is not written, so no partial PDF replaces an existing file
+        if exc_type is None:
+            self.save()
+
+    def add_sheet(self, sheet: PuzzleSheet) -> None:
+        """Draw the puzzles of the sheet with its header and footer on a new page."""
+        self.add_sheets([sheet])
+
+    def add_sheets(self, sheets: Iterable[PuzzleSheet]) -> None:
+        """
+        Draw the sheets on a page each. The board renderer already renders the boards of the next sheets,
+        while a sheet is drawn.
+        """
+        if self.app_config is None:
+            raise Exception(f'Puzzle sheets can only be added to the document {self.outfile} with an app config.')
+        sheets = list(sheets)
+        drawings = self.board_renderer.render_sheets(sheets, self.app_config.diagram_board_colors)
+        for sheet, sheet_drawings in zip(sheets, drawings, strict=True):
+            self.add_page(sheet_drawings, HeaderFooterText(sheet.left_header, sheet.right_header, sheet.footer))
+
+    def add_page(self, svgs: list[tuple[str | Drawing, bool]], header_footer_text: HeaderFooterText) -> None:
+        """
+        Draw a page with up to 12 chess puzzles
+        :param svgs: list of tuples with SVG or already rendered drawing and side to move
+        :param header_footer_text: texts to be printed in the header and footer
+        """
+        make_header(self.page_canvas, self._page_settings,
+                    header_footer_text.left_header, header_footer_text.right_header)
+        svgs = [(self.svg_render_context.render(svg) if isinstance(svg, str) else svg, turn) for svg, turn in svgs]
+        self._get_layout(len(svgs)).place(svgs, self.page_canvas)
+        make_footer(self.page_canvas, self._page_settings, header_footer_text.footer)
+        self.page_canvas.showPage()
+        self.number_of_pages += 1
+
+    def save(self) -> None:
+        self.page_canvas.save()
+
+    def _get_layout(self, number_of_puzzles: int) -> PuzzleLayout:
+        if self.layout is not None:
+            return self.layout
+        layout_type = Layout6Puzzles \
+            if number_of_puzzles <= Layout6Puzzles.MAXIMUM_PUZZLES_IN_LAYOUT \
+            else Layout12Puzzles
+        if layout_type not in self._automatic_layouts:
+            self._automatic_layouts[layout_type] = layout_type(PageSettings())
+        return self._automatic_layouts[layout_type]
+
+
+def create_layout(layout: str) -> PuzzleLayout:
+    """
+    :param layout: "6" or "12" for the layout with the respective number of puzzles on one page
+    """
+    match layout:
+        case '6':
+            return Layout6Puzzles(PageSettings())
+        case '12':
+            return Layout12Puzzles(PageSettings())
+        case _:
+            raise Exception(f'Unknown page layout {layout}.')
 
-__all__ = ('make_pdf_puzzle_page',)
 
 def make_pdf_puzzle_page(
         outfile: str | Path,
@@ -23,24 +134,23 @@ def make_pdf_puzzle_page(
     :param header_footer_text: texts to be printed in the header and footer
     :param layout: a layout for the puzzles on the page
     """
-    page_settings = PageSettings()
-    puzzle_layout = layout
-    if puzzle_layout is None:
-        puzzle_layout = Layout6Puzzles(page_settings) \
-            if len(svgs) <= Layout6Puzzles.MAXIMUM_PUZZLES_IN_LAYOUT \
-            else Layout12Puzzles(page_settings)
-    if type(layout) is Layout6Puzzles:
-        page_settings.margin_left = 2 * cm
-        page_settings.margin_right = 2 * cm
-
-    page_canvas = canvas.Canvas(
-        str(outfile),
-        pagesize=pagesizes.A4,
-    )
-    make_header(page_canvas, page_settings, header_footer_text.left_header, header_footer_text.right_header)
-    puzzle_layout.place(svgs, page_canvas)
-    make_footer(page_canvas, page_settings, header_footer_text.footer)
-    page_canvas.save()
+    make_pdf_puzzle_pages(outfile, [(svgs, header_footer_text)], layout)
+
+
+def make_pdf_puzzle_pages(
+        outfile: str | Path,
+        pages: Iterable[tuple[list[tuple[str, bool]], HeaderFooterText]],
+        layout: PuzzleLayout | None = None
+) -> None:
+    """
+    Create a PDF file with a page of up to 12 chess puzzles for each of the given pages
+    :param outfile: path to output
+    :param pages: tuples of the SVGs with side to move and the header and footer texts of each page
+    :param layout: a layout for the puzzles on all pages, None to choose a layout per page
+    """
+    with PuzzleSheetDocument(outfile, layout) as document:
+        for svgs, header_footer_text in pages:
+            document.add_page(svgs, header_footer_text)
 
 
 def make_header(page_canvas: canvas.Canvas, page_settings: PageSettings, left_text: str, right_text: str) -> None:
@@ -0,0 +1,315 @@
+import hashlib
+import json
+from collections import namedtuple
+
+import chess
+import chess.svg
+from lxml import etree
+from reportlab.graphics.shapes import Circle, Group, Path, mmult
+from reportlab.lib import colors
+from reportlab.pdfbase.pdfdoc import PDFDictionary, PDFResourceDictionary
+from reportlab.pdfgen import canvas
+from reportlab.pdfgen.pathobject import PDFPathObject
+from svglib import svglib
+from svglib.svglib import NoStrokePath
+
+# the geometry of svg_from_board, in the units of the SVG of chess.svg.board with coordinates and borders
+SQUARE_SIZE = chess.svg.SQUARE_SIZE
+BORDER = 1
+MARGIN = 15
+BOARD_OFFSET = BORDER + MARGIN + BORDER
+FULL_SIZE = 2 * BOARD_OFFSET + 8 * SQUARE_SIZE
+COORDINATE_SCALE = MARGIN / chess.svg.MARGIN
+COORDINATE_OFFSET = int(SQUARE_SIZE - COORDINATE_SCALE * SQUARE_SIZE) // 2
+
+IDENTITY = (1, 0, 0, 1, 0, 0)
+
+# the operators of ReportLab paths, any other operator closes the path
+MOVE_TO = 0
+LINE_TO = 1
+CURVE_TO = 2
+
+# the lengths of the hex colors of chess.svg, with and without an alpha channel
+SHORT_HEX_COLOR_LENGTH = len('#rgb')
+SHORT_HEX_ALPHA_COLOR_LENGTH = len('#rgba')
+HEX_COLOR_LENGTH = len('#rrggbb')
+HEX_ALPHA_COLOR_LENGTH = len('#rrggbbaa')
+
+GlyphPath = namedtuple(
+    'GlyphPath',
+    ('transform', 'path', 'fill_color', 'stroke_color', 'stroke_width', 'line_cap', 'line_join', 'fill_mode')
+)
+
+# the parameters of the opacities of fill and stroke in a graphics state dictionary of PDF
+FILL_OPACITY = 'ca'
+STROKE_OPACITY = 'CA'
+
+GlyphStyle = namedtuple('GlyphStyle', ('scale', 'color', 'opacity'))
+# draws a glyph in its own size and colors
+ORIGINAL_STYLE = GlyphStyle(1, None, 1.0)
+
+_glyphs: dict[str, list[GlyphPath]] = {}
+
+
+class BoardDiagram:
+    """
+    A chess board, that is drawn directly with canvas primitives when it is placed on a page, without creating an SVG
+    and converting it to a drawing. The diagram looks like the SVG of svg_from_board with the same colors and
+    orientation. The paths of the pieces and coordinates are taken from chess.svg once per process.
+
+    The empty board of each orientation and color scheme and every piece are defined once per PDF document as form
+    XObjects, a diagram only references the empty board and one form per piece.
+    """
+    FORM_NAME_PREFIX = 'PSG'
+    # the keys of the diagram board colors, that the empty board is drawn with
+    BOARD_COLOR_KEYS = ('outer border', 'margin', 'inner border', 'coord', 'square dark', 'square light')
+
+    def __init__(self, fen: str, orientation: bool, diagram_board_colors: dict[str, str] | None):
+        """
+        :param fen: FEN of the position
+        :param orientation: the side at the bottom of the board
+        :param diagram_board_colors: colors of the diagram as in the diagram board colors configuration
+        """
+        self.board = chess.BaseBoard(fen.split(' ', maxsplit=1)[0])
+        self.orientation = orientation
+        self.diagram_board_colors = diagram_board_colors if diagram_board_colors is not None else {}
+        self.colors_key = colors_key(self.diagram_board_colors)
+
+    def draw(self, page_canvas: canvas.Canvas, x: float, y: float, size: float) -> None:
+        """
+        Draw the board on the canvas
+        :param page_canvas: canvas of the page
+        :param x: left edge of the board
+        :param y: bottom edge of the board
+        :param size: width and height of the board
+        """
+        empty_board_form = self._get_empty_board_form(page_canvas)
+        piece_map = self.board.piece_map()
+        piece_forms = {symbol: self._get_piece_form(page_canvas, symbol)
+                       for symbol in {piece.symbol() for piece in piece_map.values()}}
+        page_canvas.saveState()
+        # draw in the coordinates of the SVG, with the origin in the top left corner and the y-axis pointing down
+        page_canvas.translate(x, y + size)
+        page_canvas.scale(size / FULL_SIZE, -size / FULL_SIZE)
+        page_canvas.doForm(empty_board_form)
+        for square, piece in piece_map.items():
+            square_x, square_y = self._square_position(square)
+            page_canvas.saveState()
+            page_canvas.translate(square_x, square_y)
+            page_canvas.doForm(piece_forms[piece.symbol()])
+            page_canvas.restoreState()
+        page_canvas.restoreState()
+
+    def _get_empty_board_form(self, page_canvas: canvas.Canvas) -> str:
+        """The name of the form of the empty board, the form is defined on the first use in the document."""
+        orientation = 'White' if self.orientation == chess.WHITE else 'Black'
+        form_name = f'{self.FORM_NAME_PREFIX}Board{orientation}{self.colors_key}'
+        if not page_canvas.hasForm(form_name):
+            page_canvas.beginForm(form_name, 0, 0, FULL_SIZE, FULL_SIZE)
+            self._draw_frame(page_canvas)
+            self._draw_coordinates(page_canvas)
+            self._draw_squares(page_canvas)
+            page_canvas.endForm(Resources=self._get_board_form_resources())
+        return form_name
+
+    def _get_piece_form(self, page_canvas: canvas.Canvas, symbol: str) -> str:
+        """The name of the form of a piece, the form is defined on the first use in the document."""
+        # PDF names are case-sensitive, the symbol distinguishes the colors of the pieces
+        form_name = f'{self.FORM_NAME_PREFIX}Piece{symbol}'
+        if not page_canvas.hasForm(form_name):
+            page_canvas.beginForm(form_name, 0, 0, SQUARE_SIZE, SQUARE_SIZE)
+            draw_glyph(page_canvas, get_piece_glyph(symbol), 0, 0)
+            page_canvas.endForm()
+        return form_name
+
+    def _draw_frame(self, page_canvas: canvas.Canvas) -> None:
+        for key, offset, width in (('outer border', 0, BORDER),
+                                   ('margin', BORDER, MARGIN),
+                                   ('inner border', BORDER + MARGIN, BORDER)):
+            page_canvas.saveState()
+            self._set_stroke_color(page_canvas, key)
+            page_canvas.setLineWidth(width)
+            inset = offset + width / 2
+            page_canvas.rect(inset, inset, FULL_SIZE - 2 * inset, FULL_SIZE - 2 * inset, stroke=1, fill=0)
+            page_canvas.restoreState()
+
+    def _draw_coordinates(self, page_canvas: canvas.Canvas) -> None:
+        color, opacity = _select_color(self.diagram_board_colors, 'coord')
+        coordinate_style = GlyphStyle(COORDINATE_SCALE, color, opacity)
+        far_side = FULL_SIZE - BORDER - MARGIN
+        for index in range(8):
+            offset = self._square_offset(index, 7 - index)
+            file_name = chess.FILE_NAMES[index]
+            rank_name = chess.RANK_NAMES[7 - index]
+            for x, y, name in ((offset + COORDINATE_OFFSET, 1, file_name),
+                               (offset + COORDINATE_OFFSET, far_side, file_name),
+                               (0, offset + COORDINATE_OFFSET, rank_name),
+                               (far_side, offset + COORDINATE_OFFSET, rank_name)):
+                draw_glyph(page_canvas, get_coordinate_glyph(name), x, y, coordinate_style)
+
+    def _draw_squares(self, page_canvas: canvas.Canvas) -> None:
+        for key, parity in (('square dark', 0), ('square light', 1)):
+            page_canvas.saveState()
+            self._set_fill_color(page_canvas, key)
+            for square in chess.SQUARES:
+                if (chess.square_file(square) + chess.square_rank(square)) % 2 == parity:
+                    x, y = self._square_position(square)
+                    page_canvas.rect(x, y, SQUARE_SIZE, SQUARE_SIZE, stroke=0, fill=1)
+            page_canvas.restoreState()
+
+    def _square_position(self, square: chess.Square) -> tuple[int, int]:
+        return (self._square_offset(chess.square_file(square), 7 - chess.square_file(square)),
+                self._square_offset(7 - chess.square_rank(square), chess.square_rank(square)))
+
+    def _square_offset(self, white_index: int, black_index: int) -> int:
+        return (white_index if self.orientation == chess.WHITE else black_index) * SQUARE_SIZE + BOARD_OFFSET
+
+    def _set_fill_color(self, page_canvas: canvas.Canvas, key: str) -> None:
+        color, opacity = _select_color(self.diagram_board_colors, key)
+        page_canvas.setFillColor(color)
+        _set_opacity(page_canvas, FILL_OPACITY, opacity)
+
+    def _set_stroke_color(self, page_canvas: canvas.Canvas, key: str) -> None:
+        color, opacity = _select_color(self.diagram_board_colors, key)
+        page_canvas.setStrokeColor(color)
+        _set_opacity(page_canvas, STROKE_OPACITY, opacity)
+
+    def _get_board_form_resources(self) -> PDFResourceDictionary:
+        """The resources of the form of the empty board, with a graphics state per opacity of its colors."""
+        opacities = {_select_color(self.diagram_board_colors, key)[1] for key in self.BOARD_COLOR_KEYS}
+        return PDFResourceDictionary(ExtGState={
+            _graphics_state_name(operator, opacity): PDFDictionary({operator: opacity})
+            for opacity in opacities if opacity < 1.0
+            for operator in (FILL_OPACITY, STROKE_OPACITY)
+        })
+
+
+def colors_key(diagram_board_colors: dict[str, str]) -> str:
+    """A short hash of the diagram board colors, that identifies a color scheme."""
+    return hashlib.sha256(json.dumps(diagram_board_colors, sort_keys=True).encode()).hexdigest()[:16]
+
+
+def get_piece_glyph(symbol: str) -> list[GlyphPath]:
+    """The paths of a piece of chess.svg.PIECES by its symbol, in the coordinates of the SVG."""
+    return _get_glyph('piece ' + symbol, chess.svg.PIECES[symbol])
+
+
+def get_coordinate_glyph(name: str) -> list[GlyphPath]:
+    """The paths of a file or rank name of chess.svg.COORDS, in the coordinates of the SVG."""
+    return _get_glyph('coordinate ' + name, f'<g fill="#000" stroke="#000">{chess.svg.COORDS[name]}</g>')
+
+
+def _get_glyph(key: str, glyph_svg: str) -> list[GlyphPath]:
+    """svglib converts the SVG of a glyph on its first use, afterwards the glyph is drawn from the cached paths."""
+    if key not in _glyphs:
+        drawing = svglib.SvgRenderer('./glyph.svg').render(etree.fromstring(
+            f'<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 {SQUARE_SIZE} {SQUARE_SIZE}">{glyph_svg}</svg>'
+        ))
+        # the first group maps the view box to the y-axis of ReportLab, the glyphs keep the coordinates of the SVG
+        _glyphs[key] = _flatten(drawing.contents[0].contents, IDENTITY)
+    return _glyphs[key]
+
+
+def _flatten(nodes: list, transform: tuple) -> list[GlyphPath]:
+    glyph_paths = []
+    for node in nodes:
+        if isinstance(node, Group):
+            glyph_paths += _flatten(node.contents, mmult(transform, node.transform))
+        elif isinstance(node, (Path, Circle)):
+            path = PDFPathObject()
+            if isinstance(node, Circle):
+                path.circle(node.cx, node.cy, node.r)
+            else:
+                _add_path_operators(path, node.operators, node.points)
+            stroke_color = node.strokeColor if not isinstance(node, NoStrokePath) and node.strokeWidth else None
+            glyph_paths.append(GlyphPath(
+                transform,
+                path,
+                node.fillColor,
+                stroke_color,
+                node.strokeWidth,
+                node.strokeLineCap,
+                node.strokeLineJoin,
+                getattr(node, 'fillMode', canvas.FILL_NON_ZERO),
+            ))
+    return glyph_paths
+
+
+def draw_glyph(
+        page_canvas: canvas.Canvas,
+        glyph: list[GlyphPath],
+        x: float,
+        y: float,
+        style: GlyphStyle = ORIGINAL_STYLE
+) -> None:
+    """
+    Draw the paths of a glyph at a position in the coordinates of the canvas
+    :param style: scale, opacity and the color that replaces the fill and stroke colors of the glyph,
+        None as color to keep the colors. An opacity below 1 needs its graphics states in the resources of the form.
+    """
+    scale, color, opacity = style
+    page_canvas.saveState()
+    page_canvas.transform(scale, 0, 0, scale, x, y)
+    for glyph_path in glyph:
+        fill_color = glyph_path.fill_color if color is None or glyph_path.fill_color is None else color
+        stroke_color = glyph_path.stroke_color if color is None or glyph_path.stroke_color is None else color
+        page_canvas.saveState()
+        if glyph_path.transform != IDENTITY:
+            page_canvas.transform(*glyph_path.transform)
+        if fill_color is not None:
+            page_canvas.setFillColor(fill_color)
+            _set_opacity(page_canvas, FILL_OPACITY, opacity)
+        if stroke_color is not None:
+            page_canvas.setStrokeColor(stroke_color)
+            _set_opacity(page_canvas, STROKE_OPACITY, opacity)
+            page_canvas.setLineWidth(glyph_path.stroke_width)
+            page_canvas.setLineCap(glyph_path.line_cap)
+            page_canvas.setLineJoin(glyph_path.line_join)
+        # the path objects only hold the PDF operators of the path, so they are drawn again on every board
+        page_canvas.drawPath(glyph_path.path, stroke=stroke_color is not None, fill=fill_color is not None,
+                             fillMode=glyph_path.fill_mode)
+        page_canvas.restoreState()
+    page_canvas.restoreState()
+
+
+def _set_opacity(page_canvas: canvas.Canvas, operator: str, opacity: float) -> None:
+    """
+    Switch to the graphics state of the opacity, until the state of the canvas is restored. ReportLab only adds its
+    own graphics states of opacities to the resources of pages, so the forms name and define their graphics states.
+    """
+    if opacity < 1.0:
+        page_canvas.addLiteral(f'/{_graphics_state_name(operator, opacity)} gs')
+
+
+def _graphics_state_name(operator: str, opacity: float) -> str:
+    # PDF names are case-sensitive, the operator distinguishes fill and stroke
+    return f'{BoardDiagram.FORM_NAME_PREFIX}{operator}{opacity:.4f}'
+
+
+def _add_path_operators(path: PDFPathObject, operators: list[int], points: list[float]) -> None:
+    index = 0
+    for operator in operators:
+        if operator == MOVE_TO:
+            path.moveTo(points[index], points[index + 1])
+            index += 2
+        elif operator == LINE_TO:
+            path.lineTo(points[index], points[index + 1])
+            index += 2
+        elif operator == CURVE_TO:
+            path.curveTo(*points[index:index + 6])
+            index += 6
+        else:
+            path.close()
+
+
+def _select_color(diagram_board_colors: dict[str, str], key: str) -> tuple[colors.Color, float]:
+    """The color and opacity of a key of the diagram board colors, like chess.svg selects them."""
+    color = diagram_board_colors.get(key, chess.svg.DEFAULT_COLORS[key])
+    opacity = 1.0
+    if color.startswith('#') and len(color) == SHORT_HEX_ALPHA_COLOR_LENGTH:
+        color, opacity = color[:SHORT_HEX_COLOR_LENGTH], int(color[SHORT_HEX_COLOR_LENGTH:], 16) / 0xf
+    elif color.startswith('#') and len(color) == HEX_ALPHA_COLOR_LENGTH:
+        color, opacity = color[:HEX_COLOR_LENGTH], int(color[HEX_COLOR_LENGTH:], 16) / 0xff
+    if color.startswith('#') and len(color) == SHORT_HEX_COLOR_LENGTH:
+        color = '#' + ''.join(2 * digit for digit in color[1:])
+    return colors.toColor(color), opacity
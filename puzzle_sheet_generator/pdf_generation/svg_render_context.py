@@ -0,0 +1,89 @@
+from lxml import etree
+from reportlab.graphics.shapes import Drawing, Group
+from svglib import svglib
+
+from puzzle_sheet_generator.pdf_generation.PuzzleLayout import svg_to_rgl
+
+SVG_NAMESPACE = 'http://www.w3.org/2000/svg'
+XLINK_NAMESPACE = 'http://www.w3.org/1999/xlink'
+
+
+class SvgRenderContext:
+    """
+    Transforms the SVGs of chess.svg boards to ReportLab drawings and reuses everything that is the same for the boards
+    of a print job. A board SVG consists of the definitions of the pieces, the background of frame, coordinates and
+    squares and a use element per piece. The background is converted once per orientation and colors and every piece
+    definition once. For every board only its use elements are parsed, they are placed as groups that share the
+    converted pieces.
+
+    The drawings share their groups with each other and with the context, so they must never be changed.
+    SVGs with another structure are converted completely.
+    """
+    # the backgrounds differ by orientation and colors, highlighted squares would add more
+    MAX_BACKGROUNDS = 16
+
+    def __init__(self):
+        self._backgrounds: dict[str, Drawing] = {}
+        # the pieces are identified by their id, chess.svg defines them the same way in all SVGs
+        self._pieces: dict[str, Group] = {}
+        # only used to apply the transforms of the use elements, it is stateless for that
+        self._svg_renderer = svglib.SvgRenderer('./fake.svg')
+
+    def render(self, svg: str) -> Drawing:
+        """
+        :param svg: SVG string of a board as created by chess.svg
+        :return: ReportLab Graphics Drawing object
+        """
+        defs_start = svg.find('<defs>')
+        defs_end = svg.find('</defs>')
+        svg_end = svg.rfind('</svg>')
+        if defs_start < 0 or defs_end < 0 or svg_end < 0:
+            return svg_to_rgl(svg)
+        defs_end += len('</defs>')
+        uses_start = svg.find('<use ', defs_end)
+        if uses_start < 0:
+            uses_start = svg_end
+        uses = etree.fromstring(f'<g xmlns="{SVG_NAMESPACE}" xmlns:xlink="{XLINK_NAMESPACE}">'
+                                f'{svg[uses_start:svg_end]}</g>')
+        if any(etree.QName(use).localname != 'use' for use in uses):
+            return svg_to_rgl(svg)
+        piece_ids = [(use.get(f'{{{XLINK_NAMESPACE}}}href') or use.get('href', '')).removeprefix('#') for use in uses]
+
+        # the description of the root element lists the position, it is not part of the background
+        root_tag = svg[:svg.find('>') + 1]
+        missing_piece_ids = sorted({piece_id for piece_id in piece_ids if piece_id not in self._pieces})
+        if missing_piece_ids:
+            self._add_pieces(root_tag, svg[defs_start:defs_end], missing_piece_ids)
+        background = self._get_background(root_tag + svg[defs_end:uses_start] + '</svg>')
+
+        main_group = background.contents[0]
+        board_group = Group(*main_group.contents, transform=main_group.transform)
+        for use, piece_id in zip(uses, piece_ids, strict=True):
+            piece_group = Group(self._pieces[piece_id])
+            transform = use.get('transform', '')
+            if use.get('x') or use.get('y'):
+                transform += f' translate({use.get("x") or 0}, {use.get("y") or 0})'
+            if transform:
+                self._svg_renderer.shape_converter.applyTransformOnGroup(transform, piece_group)
+            board_group.add(piece_group)
+        drawing = Drawing(background.width, background.height)
+        drawing.add(board_group)
+        return drawing
+
+    def _get_background(self, background_svg: str) -> Drawing:
+        background = self._backgrounds.get(background_svg)
+        if background is None:
+            if len(self._backgrounds) >= self.MAX_BACKGROUNDS:
+                self._backgrounds.clear()
+            background = svg_to_rgl(background_svg)
+            self._backgrounds[background_svg] = background
+        return background
+
+    def _add_pieces(self, root_tag: str, defs: str, piece_ids: list[str]) -> None:
+        """Convert the definitions of the pieces in one SVG that uses every piece once at the origin."""
+        uses = ''.join(f'<use href="#{piece_id}" xlink:href="#{piece_id}" />' for piece_id in piece_ids)
+        pieces = svg_to_rgl(root_tag + defs + uses + '</svg>').contents[0].contents
+        # checked before the update, so the context never holds some of the pieces of a failed conversion
+        if len(pieces) != len(piece_ids):
+            raise Exception(f'Could not convert the pieces {", ".join(piece_ids)} of the SVG.')
+        self._pieces.update(zip(piece_ids, pieces, strict=True))
@@ -1,17 +1,29 @@
 import sys
+import threading
+from concurrent.futures import Future
 from pathlib import Path
 
+import platformdirs
 from cliff.app import App
 from cliff.commandmanager import CommandManager
 
 import puzzle_sheet_generator
 from puzzle_sheet_generator.model.app_config import AppConfig
+from puzzle_sheet_generator.model.filter_result_cache import FilterResultCache
 from puzzle_sheet_generator.model.repository import PuzzleSheetRepository, PuzzleStoreRepository
+from puzzle_sheet_generator.model.used_puzzles import UsedPuzzles
+from puzzle_sheet_generator.pdf_generation.board_renderer import BoardRenderer
+from puzzle_sheet_generator.pdf_generation.diagram_cache import RenderedDiagramCache
 from puzzle_sheet_generator.puzzle_database.lichess_puzzle_db import LichessPuzzleDB
+from puzzle_sheet_generator.puzzle_database.lichess_puzzle_db_cache import LichessPuzzleDBCache
 from puzzle_sheet_generator.service.save_file_service import SaveFileService
 
 
 class PSGApp(App):
+    DIAGRAM_CACHE_DIR = 'diagrams'
+    FILTER_RESULT_CACHE_DIR = 'filter_results'
+    USED_PUZZLES_FILE = 'used_puzzles.json'
+
     def __init__(self):
         super().__init__(
             puzzle_sheet_generator.__doc__.replace("\n", " ").strip(),
@@ -24,20 +36,77 @@ class PSGApp(App):
         self.puzzle_store_repository : PuzzleStoreRepository = None
         self.puzzle_sheet_repository : PuzzleSheetRepository = None
         self.save_file_service = SaveFileService(None)
+        self.filter_result_cache: FilterResultCache = None
+        self.diagram_cache: RenderedDiagramCache = None
+        self.board_renderer: BoardRenderer = None
 
     def initialize_app(self, argv) -> None:
         self.LOG.debug(f'initialising {self.app_name} app')
-        lichess_puzzle_db = self.load_lichess_puzzle_db()
-        self.save_file_service.lichess_puzzle_database = lichess_puzzle_db
-        self.puzzle_store_repository = PuzzleStoreRepository("st", lichess_puzzle_db)
-        self.puzzle_sheet_repository = PuzzleSheetRepository("sh")
+        self.puzzle_store_repository = PuzzleStoreRepository("st", None)
+        used_puzzles = UsedPuzzles(platformdirs.user_data_path(self.app_name) / self.USED_PUZZLES_FILE)
+        self.puzzle_sheet_repository = PuzzleSheetRepository("sh", used_puzzles)
+        self.save_file_service.used_puzzles = used_puzzles
+        self.filter_result_cache = self.create_filter_result_cache()
+        self.diagram_cache = self.create_diagram_cache()
+        self.board_renderer = self.create_board_renderer()
+        self.start_loading_lichess_puzzle_db()
         self.LOG.info('The puzzle sheet generator app is ready.')
 
+    def start_loading_lichess_puzzle_db(self) -> None:
+        """
+        Load the Lichess puzzle database on a background thread, so that commands which do not need it can run
+        in the meantime. The main store of the puzzle store repository is the future of the loaded database.
+        """
+        lichess_puzzle_db_future = Future()
+
+        def load() -> None:
+            try:
+                lichess_puzzle_db_future.set_result(self.load_lichess_puzzle_db())
+            except Exception as error:
+                # like a database that is not configured, so the commands of the session keep working without it
+                self.LOG.error(f'Could not load the Lichess Puzzle DB: {error}')
+                lichess_puzzle_db_future.set_result(None)
+
+        # a daemon thread does not keep the app from exiting, when a single command is run without the interactive mode
+        threading.Thread(target=load, name='lichess-puzzle-db-loader', daemon=True).start()
+        self.save_file_service.lichess_puzzle_database_future = lichess_puzzle_db_future
+        self.puzzle_store_repository.reset_main_store(lichess_puzzle_db_future)
+
+    def create_filter_result_cache(self) -> FilterResultCache:
+        cache_dir = platformdirs.user_cache_path(self.app_name) / self.FILTER_RESULT_CACHE_DIR \
+            if self.config.get(AppConfig.FILTER_RESULT_DISK_CACHE_KEY) \
+            else None
+        return FilterResultCache(cache_dir=cache_dir)
+
+    def create_diagram_cache(self) -> RenderedDiagramCache:
+        return RenderedDiagramCache(cache_dir=self.get_diagram_cache_dir())
+
+    def get_diagram_cache_dir(self) -> Path | None:
+        """The directory of the diagram cache on disk, None if the diagrams are only cached in memory."""
+        return platformdirs.user_cache_path(self.app_name) / self.DIAGRAM_CACHE_DIR \
+            if self.config.get(AppConfig.DIAGRAM_DISK_CACHE_KEY) \
+            else None
+
+    def create_board_renderer(self) -> BoardRenderer:
+        return BoardRenderer(
+            self.config.get(AppConfig.RENDER_WORKERS_KEY),
+            self.config.get(AppConfig.RENDER_POOL_KEY),
+            self.config.get(AppConfig.DIAGRAM_RENDERER_KEY),
+            self.diagram_cache
+        )
+
+    def reset_board_renderer(self) -> None:
+        """Stop the workers of the board renderer and create a renderer with the current configuration."""
+        self.board_renderer.shutdown()
+        self.board_renderer = self.create_board_renderer()
+
     def load_lichess_puzzle_db(self) -> LichessPuzzleDB | None:
         if self._check_lichess_puzzle_db_path():
             puzzle_db_path = self.config.get(AppConfig.LICHESS_PUZZLE_DB_KEY)
-            self.LOG.info(f'Loading the Lichess Puzzle DB from {puzzle_db_path}. This may take a few seconds.')
-            return LichessPuzzleDB(puzzle_db_path)
+            self.LOG.info(f'Loading the Lichess Puzzle DB from {puzzle_db_path}.')
+            cache = LichessPuzzleDBCache(platformdirs.user_cache_path(self.app_name))
+            schema = self.config.get(AppConfig.LICHESS_PUZZLE_DB_SCHEMA_KEY)
+            return LichessPuzzleDB(puzzle_db_path, cache, schema)
         else:
             # maybe todo let the app download the lichess puzzle db automatically
             return None
@@ -54,9 +123,9 @@ class PSGApp(App):
         if not lichess_puzzle_db_path.is_file():
             self.LOG.warning(f'The path to the Lichess Puzzle Database under {lichess_puzzle_db_path} is not a file.')
             return False
-        if lichess_puzzle_db_path.suffix != ".csv":
+        if not lichess_puzzle_db_path.name.endswith(LichessPuzzleDB.FILE_SUFFIXES):
             self.LOG.warning(f'The path to the Lichess Puzzle Database under {lichess_puzzle_db_path}'
-                             f' does not have a CSV-file suffix (.csv).')
+                             f' does not have a CSV-file suffix ({", ".join(LichessPuzzleDB.FILE_SUFFIXES)}).')
             return False
         return True
 
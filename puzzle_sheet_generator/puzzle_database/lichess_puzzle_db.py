@@ -1,21 +1,113 @@
+import logging
 from os import PathLike
 
+import numpy
 import pandas
 
 from puzzle_sheet_generator.model.puzzle_store import PuzzleStore
-from puzzle_sheet_generator.puzzle_database.lichess_puzzle_db_columns import lichess_puzzle_db_column_names
+from puzzle_sheet_generator.puzzle_database import lichess_puzzle_db_columns, lichess_puzzle_themes
+from puzzle_sheet_generator.puzzle_database.lichess_puzzle_db_cache import LichessPuzzleDBCache
+from puzzle_sheet_generator.puzzle_database.opening_tag_index import OpeningTagIndex
 
 
 class LichessPuzzleDB(PuzzleStore):
+    NAME = 'Lichess Puzzle Database'
     MAXIMUM_PUZZLE_RATING_DEVIATION = 80
     MINIMUM_PUZZLE_POPULARITY = 20
+    CHUNK_SIZE = 250_000
+    # increment when the way the database is built changes, so that outdated snapshots are rebuilt
+    BUILD_VERSION = 4
+    # the CSV file is either uncompressed or compressed in a format that pandas can decompress while reading
+    FILE_SUFFIXES = ('.csv', '.csv.zst', '.csv.gz', '.csv.bz2', '.csv.xz')
 
-    def __init__(self, puzzle_db_path : str | PathLike):
-        super().__init__(
-            pandas.read_csv(puzzle_db_path, header=0, names=lichess_puzzle_db_column_names),
-            'Lichess Puzzle Database'
+    def __init__(
+            self,
+            puzzle_db_path : str | PathLike,
+            cache: LichessPuzzleDBCache | None = None,
+            schema: str = lichess_puzzle_db_columns.COMPACT_SCHEMA
+    ):
+        self.log = logging.getLogger(__name__)
+        self.schema = schema
+        puzzle_df = cache.load(puzzle_db_path, self.cache_parameters(schema)) if cache is not None else None
+        if puzzle_df is None:
+            puzzle_df = self.build(puzzle_db_path, schema)
+            if cache is not None:
+                cache.store(puzzle_db_path, self.cache_parameters(schema), puzzle_df)
+        super().__init__(puzzle_df, self.NAME)
+        if cache is not None:
+            self.database_version = cache.snapshot_version(puzzle_db_path, self.cache_parameters(schema))
+        self.opening_tag_index = OpeningTagIndex(self.puzzle_df['OpeningTags'])
+        self.log.info(f'The Lichess Puzzle DB contains {len(self)} puzzles and uses '
+                      f'{self.get_memory_footprint() / 2**20:.1f} MiB of memory with the "{schema}" schema.')
+
+    @classmethod
+    def build(cls, puzzle_db_path: str | PathLike, schema: str) -> pandas.DataFrame:
+        """
+        Read the Lichess puzzle database CSV file and drop puzzles with an unreliable rating or low popularity.
+        The puzzles are sorted by rating. The file is read in chunks and may be compressed
+        (e.g. lichess_db_puzzle.csv.zst). The prefilter is applied to every chunk, so the memory needed for reading
+        depends on the chunk size and not on the file size.
+        """
+        dtypes = lichess_puzzle_db_columns.dtypes(schema)
+        categorical_columns = []
+        if dtypes is not None:
+            # categories differ between chunks, so categorical columns are converted after joining the chunks
+            categorical_columns = [name for name, dtype in dtypes.items() if dtype == 'category']
+            dtypes = {name: 'string[pyarrow]' if name in categorical_columns else dtype
+                      for name, dtype in dtypes.items()}
+        column_names_to_keep = list(lichess_puzzle_db_columns.column_names_to_keep(schema))
+        with pandas.read_csv(
+            puzzle_db_path,
+            header=0,
+            names=lichess_puzzle_db_columns.lichess_puzzle_db_column_names,
+            usecols=lichess_puzzle_db_columns.column_names_to_read(schema),
+            dtype=dtypes,
+            compression='infer',
+            chunksize=cls.CHUNK_SIZE
+        ) as chunks:
+            puzzle_df = pandas.concat(
+                (cls.prefilter(chunk)[column_names_to_keep] for chunk in chunks),
+                ignore_index=True
+            )
+        # stores keep the order of the database, so every store is sorted by rating (see PuzzleStore)
+        puzzle_df = puzzle_df.sort_values('Rating', kind='stable', ignore_index=True)
+        for column_name in categorical_columns:
+            puzzle_df[column_name] = puzzle_df[column_name].astype('category')
+        cls.add_theme_masks(puzzle_df)
+        cls.add_number_of_moves(puzzle_df)
+        return puzzle_df
+
+    @staticmethod
+    def add_theme_masks(puzzle_df: pandas.DataFrame) -> None:
+        """Encode the themes of every puzzle in the theme bitmask columns, which are used for filtering by themes."""
+        codes, unique_themes = pandas.factorize(puzzle_df['Themes'])
+        # factorize marks missing themes with the code -1, which selects the appended empty mask
+        unique_masks = numpy.array(
+            [lichess_puzzle_themes.to_theme_mask(themes.split(' ')) for themes in unique_themes]
+            + [lichess_puzzle_themes.to_theme_mask(())],
+            dtype=numpy.uint64
         )
+        masks = unique_masks[codes]
+        for index, column_name in enumerate(lichess_puzzle_themes.theme_mask_column_names):
+            puzzle_df[column_name] = masks[:, index]
+
+    @staticmethod
+    def add_number_of_moves(puzzle_df: pandas.DataFrame) -> None:
+        """Store the number of moves of the puzzle solution, i.e. without the opponent's moves."""
+        # the moves start with the opponent's move that leads to the puzzle position
+        puzzle_df['NbMoves'] = ((puzzle_df['Moves'].str.count(' ') + 1) // 2).astype(numpy.int8)
+
+    @classmethod
+    def prefilter(cls, puzzle_df: pandas.DataFrame) -> pandas.DataFrame:
+        return puzzle_df[(puzzle_df['RatingDeviation'] <= cls.MAXIMUM_PUZZLE_RATING_DEVIATION)
+                         & (puzzle_df['Popularity'] >= cls.MINIMUM_PUZZLE_POPULARITY)]
 
-        # todo reduce startup time by having these precalculated
-        self.puzzles = self.puzzle_df[(self.puzzle_df['RatingDeviation'] <= self.MAXIMUM_PUZZLE_RATING_DEVIATION)
-                                          & (self.puzzle_df['Popularity'] >= self.MINIMUM_PUZZLE_POPULARITY)]
+    @classmethod
+    def cache_parameters(cls, schema: str) -> dict:
+        """Parameters that change the content of the database, a cached snapshot is only valid if they match."""
+        return {
+            'build_version': cls.BUILD_VERSION,
+            'maximum_puzzle_rating_deviation': cls.MAXIMUM_PUZZLE_RATING_DEVIATION,
+            'minimum_puzzle_popularity': cls.MINIMUM_PUZZLE_POPULARITY,
+            'schema': schema,
+        }
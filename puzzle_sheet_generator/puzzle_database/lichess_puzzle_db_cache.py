@@ -0,0 +1,158 @@
+import hashlib
+import json
+import logging
+import tempfile
+from os import PathLike
+from pathlib import Path
+
+import pandas
+from pyarrow import feather
+
+
+class LichessPuzzleDBCache:
+    """
+    Binary columnar snapshot (Feather) of the prefiltered Lichess puzzle database.
+    A snapshot is only used while the fingerprint of the CSV file it was built from still matches. Every CSV file and
+    set of parameters has its own snapshot, snapshots of moved, changed or older CSV files are removed.
+
+    The snapshot is stored uncompressed in the Arrow IPC format, i.e. fixed-width numeric columns and string columns
+    as offsets into a data buffer, and loaded memory-mapped. The loaded dataframe refers to the mapped file instead of
+    copies of its data, so multiple app instances share one copy of the snapshot in the OS page cache and only the
+    parts of the database that are actually used are read from disk.
+    """
+    SNAPSHOT_VERSION = 3
+    SNAPSHOT_FILE_TYPE = '.feather'
+    FINGERPRINT_FILE_TYPE = '.json'
+    HASH_BLOCK_SIZE = 1 << 20
+
+    VERSION_KEY = 'version'
+    PATH_KEY = 'path'
+    SIZE_KEY = 'size'
+    MTIME_KEY = 'mtime_ns'
+    HASH_KEY = 'sha256'
+    PARAMETERS_KEY = 'parameters'
+
+    def __init__(self, cache_dir: str | PathLike):
+        self.log = logging.getLogger(__name__)
+        self.cache_dir = Path(cache_dir)
+
+    def snapshot_path(self, puzzle_db_path: str | PathLike, parameters: dict) -> Path:
+        return self.cache_dir / (self._snapshot_name(puzzle_db_path, parameters) + self.SNAPSHOT_FILE_TYPE)
+
+    def fingerprint_path(self, puzzle_db_path: str | PathLike, parameters: dict) -> Path:
+        return self.cache_dir / (self._snapshot_name(puzzle_db_path, parameters) + self.FINGERPRINT_FILE_TYPE)
+
+    @staticmethod
+    def _snapshot_name(puzzle_db_path: str | PathLike, parameters: dict) -> str:
+        """The file name of the CSV file with a short hash of its resolved path and the parameters."""
+        path = Path(puzzle_db_path).resolve()
+        key = json.dumps({'path': str(path), 'parameters': parameters}, sort_keys=True)
+        return f'{path.name}-{hashlib.sha256(key.encode()).hexdigest()[:16]}'
+
+    def load(self, puzzle_db_path: str | PathLike, parameters: dict) -> pandas.DataFrame | None:
+        """
+        Load the snapshot for the given puzzle database file.
+        :param puzzle_db_path: path to the Lichess puzzle database CSV file
+        :param parameters: parameters the snapshot was built with, e.g. the prefilter thresholds
+        :return: the snapshot or None, if there is no valid snapshot
+        """
+        snapshot_path = self.snapshot_path(puzzle_db_path, parameters)
+        fingerprint_path = self.fingerprint_path(puzzle_db_path, parameters)
+        if not snapshot_path.is_file() or not fingerprint_path.is_file():
+            self.log.debug(f'No snapshot of {puzzle_db_path} found in {self.cache_dir}')
+            return None
+        try:
+            with fingerprint_path.open('r') as fingerprint_file:
+                cached_fingerprint = json.load(fingerprint_file)
+            if cached_fingerprint != self.fingerprint(puzzle_db_path, parameters):
+                self.log.info(f'The snapshot under {snapshot_path} is outdated.')
+                return None
+            # split_blocks keeps numeric columns as zero-copy views of the mapped file
+            return feather.read_table(snapshot_path, memory_map=True).to_pandas(split_blocks=True)
+        except (OSError, ValueError) as error:
+            self.log.warning(f'Could not load the snapshot under {snapshot_path}.')
+            self.log.warning(error)
+            return None
+
+    def store(self, puzzle_db_path: str | PathLike, parameters: dict, puzzle_df: pandas.DataFrame) -> None:
+        """
+        Write a snapshot of the given puzzle dataframe, that is valid as long as the puzzle database file is unchanged.
+        :param puzzle_db_path: path to the Lichess puzzle database CSV file the dataframe was built from
+        :param parameters: parameters the dataframe was built with, e.g. the prefilter thresholds
+        :param puzzle_df: prefiltered puzzle dataframe
+        """
+        snapshot_path = self.snapshot_path(puzzle_db_path, parameters)
+        fingerprint_path = self.fingerprint_path(puzzle_db_path, parameters)
+        try:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            # Write to a temporary file first, so other processes never see a partial snapshot.
+            # Replacing the file keeps the old snapshot intact for processes that have it mapped.
+            with tempfile.NamedTemporaryFile(dir=self.cache_dir, suffix='.tmp', delete=False) as temporary_file:
+                temporary_path = Path(temporary_file.name)
+            feather.write_feather(puzzle_df.reset_index(drop=True), temporary_path, compression='uncompressed')
+            # temporary files are only readable by the owner, the snapshot can be read by everyone
+            temporary_path.chmod(0o644)
+            temporary_path.replace(snapshot_path)
+            with fingerprint_path.open('w') as fingerprint_file:
+                json.dump(self.fingerprint(puzzle_db_path, parameters), fingerprint_file)
+            self.log.info(f'Saved a snapshot of the Lichess Puzzle Database to {snapshot_path}.')
+            self._remove_stale_snapshots()
+        except OSError as error:
+            self.log.warning(f'Could not save a snapshot of the Lichess Puzzle Database to {snapshot_path}.')
+            self.log.warning(error)
+
+    def fingerprint(self, puzzle_db_path: str | PathLike, parameters: dict) -> dict:
+        """
+        Identifies a puzzle database file by its size, modification time and a hash over its first and last block.
+        Hashing the whole multi-gigabyte file would cost more than the snapshot saves.
+        """
+        path = Path(puzzle_db_path)
+        stat = path.stat()
+        return {
+            self.VERSION_KEY: self.SNAPSHOT_VERSION,
+            self.PATH_KEY: str(path.resolve()),
+            self.SIZE_KEY: stat.st_size,
+            self.MTIME_KEY: stat.st_mtime_ns,
+            self.HASH_KEY: self._sampled_hash(path, stat.st_size),
+            self.PARAMETERS_KEY: parameters,
+        }
+
+    def snapshot_version(self, puzzle_db_path: str | PathLike, parameters: dict) -> str:
+        """Short hash of the fingerprint, that changes whenever a new snapshot would be built."""
+        fingerprint = json.dumps(self.fingerprint(puzzle_db_path, parameters), sort_keys=True)
+        return hashlib.sha256(fingerprint.encode()).hexdigest()[:16]
+
+    def _remove_stale_snapshots(self) -> None:
+        """
+        Remove the snapshots, that can never be loaded again, because their CSV file was moved or changed or they were
+        written by an older version. Snapshots of the same file with other parameters are kept.
+        """
+        for snapshot_path in self.cache_dir.glob('*' + self.SNAPSHOT_FILE_TYPE):
+            fingerprint_path = snapshot_path.with_suffix(self.FINGERPRINT_FILE_TYPE)
+            try:
+                with fingerprint_path.open('r') as fingerprint_file:
+                    cached_fingerprint = json.load(fingerprint_file)
+                puzzle_db_path = Path(cached_fingerprint.get(self.PATH_KEY, ''))
+                stat = puzzle_db_path.stat() if puzzle_db_path.is_file() else None
+            except (OSError, ValueError, AttributeError, TypeError):
+                cached_fingerprint, stat = {}, None
+            if stat is None \
+                    or cached_fingerprint.get(self.VERSION_KEY) != self.SNAPSHOT_VERSION \
+                    or cached_fingerprint.get(self.SIZE_KEY) != stat.st_size \
+                    or cached_fingerprint.get(self.MTIME_KEY) != stat.st_mtime_ns:
+                self.log.debug(f'Removing the stale snapshot {snapshot_path}.')
+                # processes that have the snapshot mapped keep reading it, on some systems it can not be removed
+                for path in (snapshot_path, fingerprint_path):
+                    try:
+                        path.unlink(missing_ok=True)
+                    except OSError as error:
+                        self.log.debug(error)
+
+    def _sampled_hash(self, path: Path, size: int) -> str:
+        sha256 = hashlib.sha256()
+        with path.open('rb') as file:
+            sha256.update(file.read(self.HASH_BLOCK_SIZE))
+            if size > self.HASH_BLOCK_SIZE:
+                file.seek(max(self.HASH_BLOCK_SIZE, size - self.HASH_BLOCK_SIZE))
+                sha256.update(file.read(self.HASH_BLOCK_SIZE))
+        return sha256.hexdigest()
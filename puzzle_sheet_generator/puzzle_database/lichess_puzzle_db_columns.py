@@ -10,3 +10,56 @@ lichess_puzzle_db_column_names = (
     'GameUrl',
     'OpeningTags'
 )
+
+# columns that are computed from the other columns when building the database
+lichess_puzzle_db_computed_column_names = (
+    'NbMoves',
+)
+
+# schemas for reading the lichess puzzle database:
+# - inferred: pandas infers the dtypes, i.e. 64-bit integers and python object strings
+# - compact: narrow integers, arrow backed strings and a categorical for the few distinct opening tag combinations
+# - minimal: like compact, but without the columns the app never reads
+INFERRED_SCHEMA = 'inferred'
+COMPACT_SCHEMA = 'compact'
+MINIMAL_SCHEMA = 'minimal'
+lichess_puzzle_db_schemas = (INFERRED_SCHEMA, COMPACT_SCHEMA, MINIMAL_SCHEMA)
+
+lichess_puzzle_db_compact_dtypes = {
+    'PuzzleId': 'string[pyarrow]',
+    'FEN': 'string[pyarrow]',
+    'Moves': 'string[pyarrow]',
+    'Rating': 'int16',
+    'RatingDeviation': 'int16',
+    'Popularity': 'int8',
+    'NbPlays': 'int32',
+    'Themes': 'string[pyarrow]',
+    'GameUrl': 'string[pyarrow]',
+    'OpeningTags': 'category',
+}
+
+# not read by the app at all
+lichess_puzzle_db_unused_column_names = ('GameUrl',)
+# only read for prefiltering the database
+lichess_puzzle_db_prefilter_column_names = ('RatingDeviation',)
+
+
+def column_names_to_read(schema: str) -> tuple[str, ...]:
+    if schema == MINIMAL_SCHEMA:
+        return tuple(name for name in lichess_puzzle_db_column_names
+                     if name not in lichess_puzzle_db_unused_column_names)
+    return lichess_puzzle_db_column_names
+
+
+def column_names_to_keep(schema: str) -> tuple[str, ...]:
+    if schema == MINIMAL_SCHEMA:
+        return tuple(name for name in column_names_to_read(schema)
+                     if name not in lichess_puzzle_db_prefilter_column_names)
+    return lichess_puzzle_db_column_names
+
+
+def dtypes(schema: str) -> dict[str, str] | None:
+    if schema == INFERRED_SCHEMA:
+        return None
+    return {name: dtype for name, dtype in lichess_puzzle_db_compact_dtypes.items()
+            if name in column_names_to_read(schema)}
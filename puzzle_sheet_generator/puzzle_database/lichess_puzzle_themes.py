@@ -1,5 +1,6 @@
 """Column names and puzzle themes in the lichess puzzle database."""
 from collections.abc import Iterable
+from math import ceil
 
 advantage_goal_themes = {
     'equality',
@@ -115,3 +116,26 @@ def to_canonical_forms(themes: Iterable[str]) -> set[str]:
         if canonical_form is not None:
             canonical_forms.add(canonical_form)
     return canonical_forms
+
+
+# Every theme has a fixed bit in the theme bitmask columns of the puzzle database.
+# Each column holds 64 bits, themes that are not in all_puzzle_themes are not encoded.
+THEME_MASK_BITS_PER_COLUMN = 64
+theme_bit_positions: dict[str, int] = {theme: position for position, theme in enumerate(sorted(all_puzzle_themes))}
+theme_mask_column_names = tuple(
+    f'ThemeMask{index}' for index in range(ceil(len(theme_bit_positions) / THEME_MASK_BITS_PER_COLUMN))
+)
+
+
+def to_theme_mask(themes: Iterable[str]) -> tuple[int, ...]:
+    """
+    Encode puzzle themes as bitmask.
+    :param themes: puzzle themes in their canonical form
+    :return: one bitmask per theme mask column
+    """
+    mask = [0] * len(theme_mask_column_names)
+    for theme in themes:
+        position = theme_bit_positions.get(theme)
+        if position is not None:
+            mask[position // THEME_MASK_BITS_PER_COLUMN] |= 1 << (position % THEME_MASK_BITS_PER_COLUMN)
+    return tuple(mask)
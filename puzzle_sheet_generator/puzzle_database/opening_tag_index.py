@@ -0,0 +1,69 @@
+from collections.abc import Collection
+from functools import reduce
+
+import numpy
+import pandas
+
+
+class OpeningTagIndex:
+    """
+    Inverted index of the opening tags in the puzzle database.
+    Maps every opening tag to the sorted row ids of the puzzles with that tag, stored in compressed sparse row form:
+    the row ids of the tag at position i in tags are row_ids[offsets[i]:offsets[i + 1]].
+    """
+
+    def __init__(self, opening_tags: pandas.Series):
+        """
+        :param opening_tags: the OpeningTags column of the puzzle database, its index labels are the row ids
+        """
+        codes, tag_combinations = pandas.factorize(opening_tags)
+        row_ids = opening_tags.index.to_numpy()
+        # group the rows by their combination of tags, missing tags have the code -1 and come first
+        order = numpy.argsort(codes, kind='stable')
+        bounds = numpy.searchsorted(codes[order], numpy.arange(len(tag_combinations) + 1))
+
+        combinations_by_tag: dict[str, list[int]] = {}
+        for code, tag_combination in enumerate(tag_combinations):
+            for tag in tag_combination.split(' '):
+                combinations_by_tag.setdefault(tag, []).append(code)
+
+        self.tags = tuple(sorted(combinations_by_tag))
+        self._tag_positions = {tag: position for position, tag in enumerate(self.tags)}
+        self._casefold_tags = {tag.casefold(): tag for tag in self.tags}
+        postings = [
+            numpy.sort(numpy.concatenate([row_ids[order[bounds[code]:bounds[code + 1]]]
+                                          for code in combinations_by_tag[tag]]))
+            for tag in self.tags
+        ]
+        self.offsets = numpy.zeros(len(self.tags) + 1, dtype=numpy.int64)
+        numpy.cumsum([len(posting) for posting in postings], out=self.offsets[1:])
+        self.row_ids = numpy.concatenate(postings).astype(numpy.int32) \
+            if postings \
+            else numpy.empty(0, dtype=numpy.int32)
+
+    def __contains__(self, tag: str) -> bool:
+        return tag in self._tag_positions
+
+    def __len__(self) -> int:
+        return len(self.tags)
+
+    def to_canonical_form(self, tag: str) -> str | None:
+        return self._casefold_tags.get(tag.casefold())
+
+    def get_row_ids(self, tag: str) -> numpy.ndarray:
+        position = self._tag_positions.get(tag)
+        if position is None:
+            return numpy.empty(0, dtype=numpy.int32)
+        return self.row_ids[self.offsets[position]:self.offsets[position + 1]]
+
+    def any_match(self, tags: Collection[str]) -> numpy.ndarray:
+        """Sorted row ids of the puzzles with at least one of the given tags"""
+        return reduce(numpy.union1d, (self.get_row_ids(tag) for tag in tags), numpy.empty(0, dtype=numpy.int32))
+
+    def all_match(self, tags: Collection[str]) -> numpy.ndarray:
+        """Sorted row ids of the puzzles with all the given tags"""
+        # intersect the shortest posting lists first, to keep the intermediate results small
+        postings = sorted((self.get_row_ids(tag) for tag in tags), key=len)
+        if not postings:
+            return numpy.empty(0, dtype=numpy.int32)
+        return reduce(lambda left, right: numpy.intersect1d(left, right, assume_unique=True), postings)
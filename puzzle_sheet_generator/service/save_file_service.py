@@ -1,4 +1,5 @@
 import json
+from concurrent.futures import Future
 from pathlib import Path
 
 import chess
@@ -7,6 +8,7 @@ import platformdirs
 from puzzle_sheet_generator.model.app_config import AppConfig
 from puzzle_sheet_generator.model.puzzle_sheet import PuzzleSheet
 from puzzle_sheet_generator.model.sheet_element import LichessPuzzle, PositionByFEN, SheetElement
+from puzzle_sheet_generator.model.used_puzzles import UsedPuzzles
 from puzzle_sheet_generator.puzzle_database.lichess_puzzle_db import LichessPuzzleDB
 
 
@@ -21,8 +23,13 @@ class SaveFileService:
     FEN_KEY = 'FEN'
     JSON_FILE_TYPE = '.json'
 
-    def __init__(self, lichess_puzzle_database: LichessPuzzleDB | None):
-        self.lichess_puzzle_database = lichess_puzzle_database
+    def __init__(
+            self,
+            lichess_puzzle_database_future: Future[LichessPuzzleDB | None] | None,
+            used_puzzles: UsedPuzzles | None = None
+    ):
+        self.lichess_puzzle_database_future = lichess_puzzle_database_future
+        self.used_puzzles = used_puzzles
 
     def save_sheet(self, puzzle_sheet: PuzzleSheet, sheet_id: str, app_config: AppConfig) -> None:
         data_path = platformdirs.user_data_path(app_config.app_name, ensure_exists=True) / self.SHEETS_DIRECTORY
@@ -41,6 +48,8 @@ class SaveFileService:
         }
         with save_path.open('w') as save_file:
             json.dump(save_data, save_file, ensure_ascii=False)
+        if self.used_puzzles is not None:
+            self.used_puzzles.update_saved_sheet(save_path, UsedPuzzles.puzzle_ids_of(puzzle_sheet))
 
     def _to_save_element(self, element: SheetElement) -> dict:
         match element:
@@ -60,37 +69,71 @@ class SaveFileService:
         if not load_path.exists():
             raise Exception(f'The path "{load_path}" does not exist or is not readable.')
         if load_path.is_file():
-            return [self._load_from_file(load_path)]
-        if load_path.is_dir():
-            loaded_sheets = []
-            for fs_node in load_path.iterdir():
-                if fs_node.is_file():
-                    loaded_sheets.append(self._load_from_file(fs_node))
-            return loaded_sheets
+            load_file_paths = [load_path]
+        elif load_path.is_dir():
+            load_file_paths = [fs_node for fs_node in load_path.iterdir() if fs_node.is_file()]
         else:
             raise Exception(f'The path "{load_path}" has an unexpected filetype.')
+        save_data = [self._read_save_file(load_file_path) for load_file_path in load_file_paths]
+        if self.used_puzzles is not None:
+            # save files of other installations or older versions are registered when they are loaded
+            self.used_puzzles.update_saved_sheets({
+                load_file_path: [
+                    save_element[self.PUZZLE_ID_KEY]
+                    for save_element in data[self.ELEMENTS_KEY]
+                    if save_element.get(self.PUZZLE_ID_KEY) is not None
+                ]
+                for load_file_path, data in zip(load_file_paths, save_data, strict=True)
+            })
+        # resolve the puzzle ids of all files in one lookup
+        lichess_puzzles = self._find_lichess_puzzles(save_data)
+        return [self._to_puzzle_sheet(data, lichess_puzzles) for data in save_data]
 
-    def _load_from_file(self, load_file_path: Path) -> PuzzleSheet:
+    def _read_save_file(self, load_file_path: Path) -> dict:
         with load_file_path.open('r') as load_file:
             data = json.load(load_file)
-            name = data.get(self.NAME_KEY)
-            elements_list = data.get(self.ELEMENTS_KEY)
-            left_header = data.get(self.LEFT_HEADER_KEY)
-            right_header = data.get(self.RIGHT_HEADER_KEY)
-            if name is None or elements_list is None or left_header is None or right_header is None:
+            if data.get(self.NAME_KEY) is None \
+                    or data.get(self.ELEMENTS_KEY) is None \
+                    or data.get(self.LEFT_HEADER_KEY) is None \
+                    or data.get(self.RIGHT_HEADER_KEY) is None:
                 raise Exception(f'The save file under "{load_file_path}" is missing required data.')
-            footer = data.get(self.FOOTER_TEXT_KEY, '')
-            elements = [self._from_save_element(save_element) for save_element in elements_list]
-            elements = list(filter(lambda e: e is not None, elements))
-            return PuzzleSheet(name, elements, left_header, right_header, footer)
+        return data
 
-    def _from_save_element(self, save_element: dict) -> SheetElement | None:
+    def _find_lichess_puzzles(self, save_data: list[dict]) -> dict[str, LichessPuzzle]:
+        lichess_puzzle_database = self.lichess_puzzle_database_future.result() \
+            if self.lichess_puzzle_database_future is not None \
+            else None
+        if lichess_puzzle_database is None:
+            return {}
+        puzzle_ids = list({
+            save_element[self.PUZZLE_ID_KEY]
+            for data in save_data
+            for save_element in data[self.ELEMENTS_KEY]
+            if save_element.get(self.PUZZLE_ID_KEY) is not None
+        })
+        lichess_puzzles = lichess_puzzle_database.get_puzzles_by_ids(puzzle_ids)
+        return {
+            puzzle_id: lichess_puzzle
+            for puzzle_id, lichess_puzzle in zip(puzzle_ids, lichess_puzzles, strict=True)
+            if lichess_puzzle is not None
+        }
+
+    def _to_puzzle_sheet(self, data: dict, lichess_puzzles: dict[str, LichessPuzzle]) -> PuzzleSheet:
+        elements = [self._from_save_element(save_element, lichess_puzzles) for save_element in data[self.ELEMENTS_KEY]]
+        elements = list(filter(lambda e: e is not None, elements))
+        return PuzzleSheet(
+            data[self.NAME_KEY],
+            elements,
+            data[self.LEFT_HEADER_KEY],
+            data[self.RIGHT_HEADER_KEY],
+            data.get(self.FOOTER_TEXT_KEY, '')
+        )
+
+    def _from_save_element(self, save_element: dict, lichess_puzzles: dict[str, LichessPuzzle]) -> SheetElement | None:
         puzzle_id = save_element.get(self.PUZZLE_ID_KEY)
         fen = save_element.get(self.FEN_KEY)
-        if puzzle_id is not None and self.lichess_puzzle_database is not None:
-            lichess_puzzle = self.lichess_puzzle_database.get_puzzle_by_id(puzzle_id)
-            if lichess_puzzle is not None:
-                return lichess_puzzle
+        if puzzle_id is not None and puzzle_id in lichess_puzzles:
+            return lichess_puzzles[puzzle_id]
 
         if fen is not None:
             return PositionByFEN(chess.Board(fen))